@@ -0,0 +1,117 @@
+"""
+Compressed archive of every page fetched by a scrape, one per term and scrape
+generation, so a term can be re-parsed and re-ingested offline
+(manage.py replay_archive) instead of recrawling Carleton.
+
+Layout under SCRAPE_ARCHIVE_DIR:
+
+    <term>/<generation>.pages.gz    one gzip member per page, appended
+    <term>/<generation>.index.jsonl one line per page: url, kind, offset, ...
+
+Concatenated gzip members are still a valid gzip file, and the index lets a
+single page be read back without decompressing the rest.
+"""
+
+import fcntl
+import gzip
+import json
+import os
+import time
+
+from django.conf import settings
+
+LANDING = "landing"
+
+
+class PageArchive:
+    def __init__(self, term, generation, root=None):
+        self.term = str(term)
+        self.generation = int(generation)
+        self.directory = os.path.join(root or settings.SCRAPE_ARCHIVE_DIR, self.term)
+        self.pages_path = os.path.join(self.directory, f"{self.generation}.pages.gz")
+        self.index_path = os.path.join(self.directory, f"{self.generation}.index.jsonl")
+
+    def append(self, kind, url, content, **params):
+        """
+        Append a page. kind is one of landing/subjects/search/course, params
+        identify the page further (subject, crn).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        data = gzip.compress(content.encode())
+        # Several worker processes append to the same archive
+        with open(self.pages_path, "ab") as pages:
+            fcntl.flock(pages, fcntl.LOCK_EX)
+            try:
+                offset = pages.seek(0, os.SEEK_END)
+                pages.write(data)
+                pages.flush()
+                entry = {
+                    "kind": kind,
+                    "url": url,
+                    "offset": offset,
+                    "length": len(data),
+                    "fetched_at": time.time(),
+                    **params,
+                }
+                with open(self.index_path, "a") as index:
+                    index.write(json.dumps(entry) + "\n")
+            finally:
+                fcntl.flock(pages, fcntl.LOCK_UN)
+
+    def entries(self, kind=None):
+        """Index entries in fetch order, the last fetch of a URL wins."""
+        latest = {}
+        with open(self.index_path) as index:
+            for line in index:
+                entry = json.loads(line)
+                if kind is None or entry["kind"] == kind:
+                    latest.pop(entry["url"], None)
+                    latest[entry["url"]] = entry
+        return list(latest.values())
+
+    def read(self, entry, pages=None):
+        if pages is None:
+            with open(self.pages_path, "rb") as pages:
+                return self.read(entry, pages)
+        pages.seek(entry["offset"])
+        return gzip.decompress(pages.read(entry["length"])).decode()
+
+    def pages(self, kind=None):
+        """Yield (entry, content) for every archived page."""
+        with open(self.pages_path, "rb") as pages:
+            for entry in self.entries(kind):
+                yield entry, self.read(entry, pages)
+
+
+def generations(term, root=None):
+    directory = os.path.join(root or settings.SCRAPE_ARCHIVE_DIR, str(term))
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(name.split(".")[0])
+        for name in os.listdir(directory)
+        if name.endswith(".index.jsonl")
+    )
+
+
+def latest(term, root=None):
+    found = generations(term, root)
+    return PageArchive(term, found[-1], root) if found else None
+
+
+def prune(term, keep=None, root=None):
+    """Remove all but the newest keep archives of a term."""
+    keep = settings.SCRAPE_ARCHIVE_KEEP if keep is None else keep
+    if keep <= 0:
+        return
+    for generation in generations(term, root)[:-keep]:
+        archive = PageArchive(term, generation, root)
+        for path in (archive.pages_path, archive.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def archive_page(term, generation, kind, url, content, **params):
+    """Append a page to the term's archive, unless archiving is disabled."""
+    if settings.SCRAPE_ARCHIVE_DIR:
+        PageArchive(term, generation).append(kind, url, content, **params)
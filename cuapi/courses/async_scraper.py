@@ -0,0 +1,249 @@
+"""
+asyncio crawler for Carleton's public course schedule.
+
+The crawl is pipelined: as soon as a subject's CRN list comes back its course
+detail pages are queued, instead of enumerating every subject first. Each
+stage (subject lists, CRN searches, course details) has its own concurrency
+limit and all of them share one keep-alive connection pool. On top of that
+an adaptive limit (courses/ratelimit.py) caps the requests in flight and
+converges on what upstream sustains, up to --max-connections.
+
+    python -m courses.async_scraper --detail-concurrency 32
+
+Use --record DIR to keep the fetched pages and courses.fixture_server to
+replay them later without network access.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from .carleton import (
+    CARLETON_ROOT_URL,
+    LANDING_PATH,
+    SEARCH_PATH,
+    SUBJECTS_PATH,
+    course_path,
+    endpoint,
+    setup_form_data,
+    subjects_form_data,
+)
+from .fixture_server import fixture_path, request_key
+from .metrics import PARSE_SECONDS, observe_fetch, start_metrics_server, timed
+from .parser import (
+    parse_course_details,
+    parse_crns,
+    parse_session_code,
+    parse_subjects,
+    parse_terms,
+)
+from .ratelimit import AIMDController, AsyncLimiter
+
+logger = logging.getLogger(__name__)
+
+BACKEND_URL = "http://127.0.0.1:3969/add-course-details/"
+
+
+class AsyncCourseScraper:
+    def __init__(
+        self,
+        base_url=CARLETON_ROOT_URL,
+        subject_concurrency=4,
+        crn_concurrency=8,
+        detail_concurrency=16,
+        max_connections=32,
+        initial_concurrency=4,
+        timeout=30.0,
+        record_dir=None,
+        sink=None,
+        parse_executor=None,
+        batch_size=50,
+    ):
+        self.base_url = base_url
+        self.subject_limit = asyncio.Semaphore(subject_concurrency)
+        self.crn_limit = asyncio.Semaphore(crn_concurrency)
+        self.detail_limit = asyncio.Semaphore(detail_concurrency)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.limiter = AsyncLimiter(
+            AIMDController(initial=initial_concurrency, maximum=max_connections)
+        )
+        self.timeout = timeout
+        self.record_dir = record_dir
+        # async callable receiving each parsed course, defaults to posting
+        # them to the backend batch_size at a time
+        self.sink = sink or self.add_course_details
+        self.batch_size = batch_size
+        self.batch = []
+        # Optional process pool so parsing doesn't hold up the event loop
+        self.parse_executor = parse_executor
+        self.client = None
+        self.stats = {"pages": 0, "courses": 0, "errors": 0}
+
+    async def send(self, request):
+        # Timed here so waiting for the limiter doesn't count as latency
+        start = time.perf_counter()
+        response = await self.client.send(request)
+        observe_fetch(endpoint(request.url), time.perf_counter() - start)
+        return response
+
+    async def fetch(self, method, path, data=None):
+        request = self.client.build_request(method, path, data=data)
+        response = await self.limiter.call(lambda: self.send(request))
+        response.raise_for_status()
+        self.stats["pages"] += 1
+
+        if self.record_dir:
+            key = request_key(
+                method, request.url.path, request.url.query, request.content
+            )
+            with open(fixture_path(self.record_dir, key), "w") as f:
+                f.write(response.text)
+
+        return response.text
+
+    async def submit_course_details(self, courses):
+        request_body = {
+            # add_course_details expects the CRN key upper-cased
+            "course_details": [{**course, "CRN": course["crn"]} for course in courses],
+            "worker_key": os.getenv("WORKER_KEY"),
+        }
+        response = await self.client.post(BACKEND_URL, json=request_body)
+        if response.status_code != 200:
+            logger.warning(f"Failed to post course details: {response.status_code}")
+
+    async def add_course_details(self, course):
+        self.batch.append(course)
+        if len(self.batch) >= self.batch_size:
+            await self.flush_course_details()
+
+    async def flush_course_details(self):
+        # Taken before awaiting, courses parsed meanwhile start the next batch
+        batch, self.batch = self.batch, []
+        if batch:
+            await self.submit_course_details(batch)
+
+    async def crawl_course(self, session_code, term, crn):
+        async with self.detail_limit:
+            try:
+                page = await self.fetch("GET", course_path(term, session_code, crn))
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Failed to fetch CRN {crn} in term {term}: {e!r}")
+                return
+
+        loop = asyncio.get_running_loop()
+        details, seconds = await loop.run_in_executor(
+            self.parse_executor, timed, parse_course_details, page
+        )
+        PARSE_SECONDS.labels("course").observe(seconds)
+        if details:
+            self.stats["courses"] += 1
+            await self.sink(details)
+
+    async def crawl_subject(self, tasks, session_code, term, subject):
+        async with self.crn_limit:
+            data = setup_form_data(term, subject, session_code)
+            try:
+                page = await self.fetch("POST", SEARCH_PATH, data=data)
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Failed to search {subject} in term {term}: {e!r}")
+                return
+
+        crns = parse_crns(page)
+        logger.info(f"Term {term}, subject {subject}: {len(crns)} CRNs")
+        for crn in crns:
+            tasks.create_task(self.crawl_course(session_code, term, crn))
+
+    async def crawl_term(self, tasks, session_code, term):
+        async with self.subject_limit:
+            data = subjects_form_data(term, session_code)
+            try:
+                page = await self.fetch("POST", SUBJECTS_PATH, data=data)
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Failed to list subjects of term {term}: {e!r}")
+                return
+
+        for subject in parse_subjects(page):
+            tasks.create_task(self.crawl_subject(tasks, session_code, term, subject))
+
+    async def run(self, terms=None):
+        start_time = time.perf_counter()
+
+        async with httpx.AsyncClient(
+            base_url=self.base_url, limits=self.limits, timeout=self.timeout
+        ) as client:
+            self.client = client
+            landing = await self.fetch("GET", LANDING_PATH)
+            session_code = parse_session_code(landing)
+            terms = terms or [term["term_code"] for term in parse_terms(landing)]
+
+            async with asyncio.TaskGroup() as tasks:
+                for term in terms:
+                    tasks.create_task(self.crawl_term(tasks, session_code, term))
+            await self.flush_course_details()
+
+        self.stats["seconds"] = time.perf_counter() - start_time
+        return self.stats
+
+
+async def discard(course):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default=CARLETON_ROOT_URL)
+    parser.add_argument(
+        "--term", action="append", dest="terms", help="Only crawl these term codes"
+    )
+    parser.add_argument("--subject-concurrency", type=int, default=4)
+    parser.add_argument("--crn-concurrency", type=int, default=8)
+    parser.add_argument("--detail-concurrency", type=int, default=16)
+    parser.add_argument("--max-connections", type=int, default=32)
+    parser.add_argument("--initial-concurrency", type=int, default=4)
+    parser.add_argument("--parse-processes", type=int, help="Default: CPU count")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--record", metavar="DIR", help="Save every fetched page")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Parse pages but don't submit them"
+    )
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+
+    parse_executor = ProcessPoolExecutor(args.parse_processes)
+    scraper = AsyncCourseScraper(
+        base_url=args.base_url,
+        subject_concurrency=args.subject_concurrency,
+        crn_concurrency=args.crn_concurrency,
+        detail_concurrency=args.detail_concurrency,
+        max_connections=args.max_connections,
+        initial_concurrency=args.initial_concurrency,
+        record_dir=args.record,
+        sink=discard if args.dry_run else None,
+        parse_executor=parse_executor,
+        batch_size=args.batch_size,
+    )
+    with parse_executor:
+        stats = asyncio.run(scraper.run(args.terms))
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Benchmarks for the hot paths of the courses app.
+
+Run them with ``python manage.py benchmark [name ...]``. Every benchmark runs
+inside a transaction that is rolled back afterwards, so nothing it writes is
+left behind in the database. Those that need data store a synthetic catalog
+(see catalog.py) in that transaction first, the same for the same seed, so
+results of different commits are comparable.
+"""
+
+import glob
+import json
+import os
+import random
+import statistics
+import time
+from itertools import islice
+
+from django.db import connection, models, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .catalog import generate_catalog
+from .fixture_server import FIXTURE_PAGES
+from .ga import SectionScheduler
+from .ingest import upsert_course_details
+from .models import Offering, offering_search_vector, search_offerings
+from .parser import parse_course_details
+from .stats import percentile
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+
+    return decorator
+
+
+def measure(fn, iterations):
+    """
+    Call fn(i) for i in range(iterations) and summarize wall time and the
+    number of queries issued per call.
+    """
+    durations = []
+    query_count = 0
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            fn(i)
+            durations.append(time.perf_counter() - start)
+        query_count += len(queries.captured_queries)
+
+    total = sum(durations)
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+        "per_second": iterations / total if total else 0.0,
+        "queries_per_call": query_count / iterations,
+    }
+
+
+def run_benchmarks(names=None, iterations=200, **options):
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        with transaction.atomic():
+            results[name] = fn(iterations, **options)
+            transaction.set_rollback(True)
+    return results
+
+
+def regressions(baseline, results, threshold=1.2, path=()):
+    """
+    The measurements of results whose p95 is more than threshold times the
+    one of the same measurement in baseline, as (name, baseline, p95) tuples.
+    """
+    found = []
+    for key, value in results.items():
+        before = baseline.get(key) if isinstance(baseline, dict) else None
+        if not isinstance(value, dict) or not isinstance(before, dict):
+            continue
+        if "p95_ms" in value and "p95_ms" in before:
+            if value["p95_ms"] > before["p95_ms"] * threshold:
+                found.append(
+                    ("/".join(path + (key,)), before["p95_ms"], value["p95_ms"])
+                )
+        else:
+            found += regressions(before, value, threshold, path + (key,))
+    return found
+
+
+def load_catalog(subjects=20, crns=100, seed=0, **options):
+    """Store a one term synthetic catalog, returns its registration term."""
+    records = list(generate_catalog(1, subjects, crns, seed))
+    upsert_course_details(records)
+    return records[0]["registration_term"]
+
+
+def _make_offering(i, prefix):
+    return Offering(
+        related_offering=f"{prefix} {1000 + i}",
+        registration_term="BENCH",
+        long_title=f"Benchmark Offering {i}",
+        short_title=f"Bench {i}",
+        description="",
+    )
+
+
+def _legacy_offering_save(offering):
+    # The original Offering.save: insert, refetch, then save the vector.
+    models.Model.save(offering)
+    refetched = Offering.objects.get(pk=offering.pk)
+    refetched.search_vector = offering_search_vector()
+    models.Model.save(refetched)
+
+
+@benchmark("offering_save")
+def bench_offering_save(iterations, **options):
+    return {
+        "legacy": measure(
+            lambda i: _legacy_offering_save(_make_offering(i, "LEG")), iterations
+        ),
+        "single_statement": measure(
+            lambda i: _make_offering(i, "NEW").save(), iterations
+        ),
+    }
+
+
+def load_course_pages(fixtures):
+    """Course detail pages recorded with the async scraper's --record option."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures, "*.html"))):
+        with open(path) as f:
+            page = f.read()
+        if "Registration Term:" in page:
+            pages.append(page)
+    return pages
+
+
+@benchmark("parse_course_pages")
+def bench_parse_course_pages(iterations, fixtures=None, **options):
+    # The committed fixture pages unless given recorded ones
+    pages = load_course_pages(fixtures or FIXTURE_PAGES)
+    if not pages:
+        return {"skipped": f"no course pages in {fixtures or FIXTURE_PAGES}"}
+    result = measure(lambda i: parse_course_details(pages[i % len(pages)]), iterations)
+    result["pages"] = len(pages)
+    return result
+
+
+# Query types users type into the search box, on the catalog's subjects
+SEARCH_QUERIES = {
+    "course_code": "COMP 1005",
+    "subject": "MATH",
+    "title_word": "introduction",
+    "title_phrase": '"computer science"',
+    "misspelled": "stastics",
+    "no_match": "zzzz",
+}
+
+
+@benchmark("search_offerings")
+def bench_search_offerings(iterations, **options):
+    term = load_catalog(**options)
+    results = {}
+    for kind, query in SEARCH_QUERIES.items():
+        results[kind] = measure(
+            lambda i: list(search_offerings(query).filter(registration_term=term)),
+            iterations,
+        )
+        results[kind]["query"] = query
+    return results
+
+
+# Number of courses to schedule together
+SCHEDULE_SIZES = [2, 4, 6]
+
+
+@benchmark("schedule")
+def bench_schedule(iterations, seed=0, **options):
+    term = load_catalog(seed=seed, **options)
+    ids = list(
+        Offering.objects.filter(registration_term=term)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    results = {}
+    for size in SCHEDULE_SIZES:
+        rng = random.Random(seed)
+        combinations = [rng.sample(ids, size) for _ in range(iterations)]
+
+        def run(i):
+            # The scheduler is randomized, seed it for repeatable runs
+            random.seed(seed + i)
+            offerings = Offering.objects.filter(id__in=combinations[i])
+            SectionScheduler(offerings).run()
+
+        results[f"{size}_courses"] = measure(run, iterations)
+    return results
+
+
+@benchmark("change_feed_lock")
+def bench_change_feed_lock(iterations, batch_size=50, seed=0, **options):
+    """
+    Upserts of a chunk of changed CRNs, as a crawl's tasks store them. Each
+    holds the change feed's lock from its first write until commit (see
+    courses/changes.py), so about 1 / mean_ms chunks go through per second
+    however many workers store them.
+    """
+    records = list(islice(generate_catalog(1, 1, batch_size, seed), batch_size))
+    upsert_course_details(records)
+
+    def upsert(i):
+        for record in records:
+            # Changes the documents, so every row is rewritten
+            record["short_title"] = f"Benchmark {i}"
+        upsert_course_details(records)
+
+    result = measure(upsert, iterations)
+    result["rows_per_second"] = result["per_second"] * batch_size
+    return result
+
+
+def course_details_payload(record):
+    """A record as the scrapers post it to /add-course-details/."""
+    payload = dict(record)
+    payload["CRN"] = payload.pop("crn")
+    return payload
+
+
+@benchmark("add_course_details")
+def bench_add_course_details(iterations, batch_size=50, seed=0, **options):
+    count = iterations * batch_size
+    # Enough CRNs for every batch to insert new ones
+    records = list(islice(generate_catalog(1, count // 1000 + 1, 1000, seed), count))
+    batches = [
+        json.dumps(
+            {
+                "course_details": [
+                    course_details_payload(record)
+                    for record in records[i * batch_size : (i + 1) * batch_size]
+                ]
+            }
+        )
+        for i in range(iterations)
+    ]
+    client = Client()
+
+    def post(i):
+        response = client.post(
+            "/add-course-details/", batches[i], content_type="application/json"
+        )
+        assert response.status_code == 200, response.status_code
+
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        results = {"insert": measure(post, iterations)}
+        # The same batches again, as every crawl after the first posts them
+        results["unchanged"] = measure(post, iterations)
+    for result in results.values():
+        result["rows_per_second"] = result["per_second"] * batch_size
+    return results
@@ -0,0 +1,126 @@
+"""
+Endpoints and request builders for Carleton's public course schedule
+(central.carleton.ca). Kept free of Django so the standalone scrapers can use
+it too.
+"""
+
+from urllib.parse import urlencode, urlsplit
+
+CARLETON_ROOT_URL = "https://central.carleton.ca/prod/"
+
+LANDING_PATH = "bwysched.p_select_term?wsea_code=EXT"
+SUBJECTS_PATH = "bwysched.p_search_fields"
+SEARCH_PATH = "bwysched.p_course_search"
+COURSE_PATH = "bwysched.p_display_course"
+
+# Kind of page served by each endpoint, e.g. to label metrics
+ENDPOINTS = {
+    LANDING_PATH.split("?")[0]: "landing",
+    SUBJECTS_PATH: "subjects",
+    SEARCH_PATH: "search",
+    COURSE_PATH: "course",
+}
+
+CARLETON_BASE_URL = CARLETON_ROOT_URL + LANDING_PATH
+CARLETON_SUBJECTS_URL = CARLETON_ROOT_URL + SUBJECTS_PATH
+CARLETON_POST_URL = CARLETON_ROOT_URL + SEARCH_PATH
+
+
+def endpoint(url):
+    """Kind of page a URL points to: landing, subjects, search or course."""
+    return ENDPOINTS.get(urlsplit(str(url)).path.rsplit("/", 1)[-1], "other")
+
+
+def course_path(term, session_code, crn):
+    return f"{COURSE_PATH}?wsea_code=EXT&term_code={term}&disp={session_code}&crn={crn}"
+
+
+def course_url(term, session_code, crn):
+    return CARLETON_ROOT_URL + course_path(term, session_code, crn)
+
+
+def canonical_url(path, **params):
+    """
+    URL identifying a page regardless of the session id or the HTTP method it
+    was fetched with, e.g. to index archived pages.
+    """
+    return f"{CARLETON_ROOT_URL}{path}?{urlencode(params)}"
+
+
+def subjects_form_data(term, session_code):
+    return {"wsea_code": "EXT", "session_id": session_code, "term_code": term}
+
+
+class FormData:
+    def __init__(self) -> None:
+        self.data = {}
+
+    def add(self, key, value):
+        # check if key exists
+        if key in self.data:
+            # if key exists, create a list of values
+            if isinstance(self.data[key], list):
+                self.data[key].append(value)
+            else:
+                self.data[key] = [self.data[key], value]
+        else:
+            self.data[key] = value
+
+    def get(self):
+        return self.data
+
+
+def setup_form_data(term, subject, session_code):
+    data = FormData()
+    data.add("wsea_code", "EXT")
+    data.add("term_code", term)
+    data.add("session_id", session_code)
+    data.add("sel_subj", subject)
+    data.add("sel_special", "N")
+    data.add("sel_begin_hh", "0")
+    data.add("sel_begin_mi", "0")
+    data.add("sel_begin_am_pm", "a")
+    data.add("sel_end_hh", "0")
+    data.add("sel_end_mi", "0")
+    data.add("sel_end_am_pm", "a")
+    days = ["m", "t", "w", "r", "f", "s", "u"]
+    for day in days:
+        data.add(f"sel_day", day)
+    dummy_fields = [
+        "sel_aud",
+        "sel_subj",
+        "sel_camp",
+        "sel_sess",
+        "sel_attr",
+        "sel_levl",
+        "sel_schd",
+        "sel_insm",
+        "sel_link",
+        "sel_wait",
+        "sel_day",
+        "sel_begin_hh",
+        "sel_begin_mi",
+        "sel_begin_am_pm",
+        "sel_end_hh",
+        "sel_end_mi",
+        "sel_end_am_pm",
+        "sel_instruct",
+        "sel_special",
+        "sel_resd",
+        "sel_breadth",
+    ]
+    for field in dummy_fields:
+        data.add(field, "dummy")
+    blank_fields = [
+        "ws_numb",
+        "sel_number",
+        "sel_crn",
+        "sel_sess",
+        "sel_schd",
+        "sel_instruct",
+        "block_button",
+        "sel_levl",
+    ]
+    for field in blank_fields:
+        data.add(field, "")
+    return data.get()
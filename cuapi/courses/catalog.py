@@ -0,0 +1,209 @@
+"""
+Synthetic course catalog for benchmarks and load tests, shaped like what the
+scrapers store: courses with lecture sections (A, B, ...) and their tutorials
+(A1, A2, ...), the schedule types CourseDetails.is_lecture knows, meeting
+times on the usual :05/:35 grid and a mix of statuses.
+
+The same seed always gives the same catalog.
+"""
+
+import random
+
+from .terms import registration_term
+
+SUBJECTS = {
+    "COMP": "Computer Science",
+    "MATH": "Mathematics",
+    "STAT": "Statistics",
+    "PHYS": "Physics",
+    "CHEM": "Chemistry",
+    "BIOL": "Biology",
+    "ECON": "Economics",
+    "PSYC": "Psychology",
+    "HIST": "History",
+    "ENGL": "English",
+    "PHIL": "Philosophy",
+    "SOCI": "Sociology",
+    "BUSI": "Business",
+    "ECOR": "Engineering",
+    "SYSC": "Systems and Computer Engineering",
+    "ELEC": "Electronics",
+    "GEOG": "Geography",
+    "LAWS": "Law",
+    "PSCI": "Political Science",
+    "COMS": "Communication Studies",
+    "ARTH": "Art History",
+    "MUSI": "Music",
+    "FREN": "French",
+    "LING": "Linguistics",
+    "NEUR": "Neuroscience",
+    "ERTH": "Earth Sciences",
+    "ENVE": "Environmental Engineering",
+    "JOUR": "Journalism",
+    "ANTH": "Anthropology",
+    "CGSC": "Cognitive Science",
+}
+TITLE_PATTERNS = [
+    "Introduction to {}",
+    "Foundations of {}",
+    "Topics in {}",
+    "Advanced {}",
+    "{} Methods",
+    "Seminar in {}",
+    "{} and Society",
+    "Research in {}",
+]
+
+# (schedule type, weight), the first are CourseDetails.is_lecture aliases
+LECTURE_TYPES = [
+    ("Lecture", 80),
+    ("Seminar", 8),
+    ("Studio", 2),
+    ("Workshop", 2),
+    ("Directed Studies", 2),
+    ("Honours Essay", 1),
+    ("Practicum", 1),
+    ("Other", 1),
+]
+TUTORIAL_TYPES = [("Tutorial", 60), ("Laboratory", 30), ("Discussion Group", 10)]
+STATUSES = [
+    ("Open", 65),
+    ("Full, No Waitlist", 15),
+    ("Waitlist Open", 10),
+    ("Registration Closed", 10),
+]
+SECTION_TYPES = [("In-Person", 80), ("Online", 10), ("Hybrid", 10)]
+
+# Meeting patterns: days and length in minutes
+LECTURE_PATTERNS = [
+    (["Mon", "Wed"], 80),
+    (["Tue", "Thu"], 80),
+    (["Wed", "Fri"], 80),
+    (["Mon"], 170),
+    (["Thu"], 170),
+]
+TUTORIAL_PATTERNS = [(["Mon"], 50), (["Tue"], 50), (["Wed"], 110), (["Fri"], 50)]
+# Start hours, most classes are taught late morning and early afternoon
+START_HOURS = [(8, 5), (9, 8), (10, 12), (11, 14), (12, 12), (13, 12), (14, 12)]
+START_HOURS += [(15, 10), (16, 7), (17, 4), (18, 3), (19, 1)]
+
+TERM_DATES = {
+    "10": "Jan 08, {year} to Apr 10, {year}",
+    "20": "May 06, {year} to Aug 16, {year}",
+    "30": "Sep 04, {year} to Dec 06, {year}",
+}
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def term_codes(count, first="202430"):
+    """count consecutive term codes starting at first."""
+    codes = []
+    year, season = int(first[:4]), int(first[4:])
+    for _ in range(count):
+        codes.append(f"{year}{season}")
+        season += 10
+        if season > 30:
+            year, season = year + 1, 10
+    return codes
+
+
+def subject_codes(count):
+    codes = list(SUBJECTS)[:count]
+    # Made up ones past the real list
+    for i in range(count - len(codes)):
+        codes.append(
+            f"X{i // 26 // 26 % 26 + 65:c}{i // 26 % 26 + 65:c}{i % 26 + 65:c}"
+        )
+    return codes
+
+
+def meeting(rng, term_code, patterns, schedule_type):
+    if rng.random() < 0.05:
+        # Asynchronous online sections have no meeting time
+        days, time = [], ""
+    else:
+        days, minutes = rng.choice(patterns)
+        start = weighted(rng, START_HOURS) * 60 + rng.choice([5, 35])
+        end = start + minutes
+        time = f"{start // 60:02d}:{start % 60:02d} - {end // 60:02d}:{end % 60:02d}"
+    return {
+        "meeting_date": TERM_DATES[term_code[-2:]].format(year=term_code[:4]),
+        "days": days,
+        "time": time,
+        "schedule_type": schedule_type,
+        "instructor": f"Instructor {rng.randint(1, 500)}",
+    }
+
+
+def course_details(rng, term_code, crn, subject, number, title, section, lecture):
+    schedule_type = weighted(rng, LECTURE_TYPES if lecture else TUTORIAL_TYPES)
+    patterns = LECTURE_PATTERNS if lecture else TUTORIAL_PATTERNS
+    section_type = weighted(rng, SECTION_TYPES)
+    term = registration_term(term_code)
+    if number >= 2000:
+        description = (
+            f"{title}. Covers the core ideas of the area with weekly readings "
+            f"and assignments. Precondition: {subject} {number - 1000}."
+        )
+    else:
+        description = f"{title}. No prior knowledge of the area is assumed."
+    return {
+        "registration_term": term,
+        "crn": crn,
+        "subject_code": f"{subject} {number} {section}",
+        "long_title": title,
+        "short_title": title.upper()[:30],
+        "course_description": description,
+        "course_credit_value": rng.choice([0.5, 0.5, 0.5, 1.0]) if lecture else 0.0,
+        "schedule_type": schedule_type,
+        "registration_status": weighted(rng, STATUSES),
+        "global_id": term + crn,
+        "related_offering": f"{subject} {number}",
+        "section_key": section[0],
+        "section_information": {
+            "section_type": section_type,
+            "suitability": (
+                "SUITABLE FOR ONLINE STUDENTS"
+                if section_type == "Online"
+                else "NOT SUITABLE FOR ONLINE STUDENTS"
+            ),
+        },
+        "meeting_details": [meeting(rng, term_code, patterns, schedule_type)],
+    }
+
+
+def course_sections(rng):
+    """Section codes of one course: lectures A, B, ... with tutorials A1, A2, ..."""
+    for section in "ABC"[: rng.choice([1, 1, 1, 2, 3])]:
+        yield section, True
+        for i in range(rng.choice([0, 0, 1, 2, 3, 4])):
+            yield f"{section}{i + 1}", False
+
+
+def generate_catalog(terms=1, subjects=20, crns=100, seed=0):
+    """
+    Yield CourseDetails records (dicts of ingest.COURSE_DETAILS_FIELDS) for
+    terms × subjects × crns CRNs, ready for ingest.upsert_course_details.
+    """
+    rng = random.Random(seed)
+    for term_index, term_code in enumerate(term_codes(terms)):
+        for subject_index, subject in enumerate(subject_codes(subjects)):
+            name = SUBJECTS.get(subject, f"Subject {subject}")
+            numbers = iter(sorted(rng.sample(range(1000, 5000), k=min(crns, 4000))))
+            produced = 0
+            while produced < crns:
+                number = next(numbers)
+                title = f"{rng.choice(TITLE_PATTERNS).format(name)} {number % 10 + 1}"
+                for section, lecture in course_sections(rng):
+                    if produced == crns:
+                        break
+                    # Unique within the catalog
+                    crn = f"{term_index}{subject_index:04d}{produced:04d}"
+                    produced += 1
+                    yield course_details(
+                        rng, term_code, crn, subject, number, title, section, lecture
+                    )
@@ -0,0 +1,104 @@
+"""
+Change feed of CourseDetails, for clients keeping a local copy in sync.
+
+Every CourseDetails write that changes the row's document takes the next
+number of a database sequence into change_seq, and every delete leaves a
+CourseDetailsTombstone with one, both by triggers (migration 0016) so that
+bulk statements and raw deletes are covered too. The triggers hold an
+advisory lock from the first change until commit, so numbers are handed out
+in commit order: once a change is visible, so are all lower numbered ones,
+and a client that has applied everything up to some number never misses a
+change by asking for what came after it.
+
+    GET /changes/?term=F&since=0        the first page
+    GET /changes/?term=F&since=<next>   until "more" is false
+
+The lock serializes the transactions writing CourseDetails, from their first
+write to commit, which is most of an upsert (see the change_feed_lock
+benchmark for how many chunks it lets through per second). They take it
+with lock_change_feed() before their first write rather than leave it to
+the triggers: a trigger would take it while its transaction already holds
+row locks, and a sweep and an upsert locking the same rows in different
+orders would deadlock.
+
+Tombstones older than CHANGE_FEED_TOMBSTONE_TTL are pruned daily. The
+highest number pruned is the term's ChangeFeedHorizon, clients that synced
+below it get 410 Gone and have to start over from since=0.
+"""
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ChangeFeedHorizon, CourseDetails, CourseDetailsTombstone
+
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Key of the advisory lock, the triggers of migration 0016 take it too
+CHANGE_FEED_LOCK = 4901
+
+
+def lock_change_feed():
+    """Take the change feed's lock until the transaction ends."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CHANGE_FEED_LOCK])
+
+
+def horizon(registration_term):
+    """The highest change number of the term whose tombstone was pruned."""
+    found = ChangeFeedHorizon.objects.filter(registration_term=registration_term)
+    return found.values_list("change_seq", flat=True).first() or 0
+
+
+def prune_tombstones(now=None):
+    """
+    Delete the tombstones older than CHANGE_FEED_TOMBSTONE_TTL and raise the
+    horizons of their terms. Returns the number deleted.
+    """
+    cutoff = (now or timezone.now()) - settings.CHANGE_FEED_TOMBSTONE_TTL
+    old = CourseDetailsTombstone.objects.filter(deleted_at__lt=cutoff)
+    with transaction.atomic():
+        pruned = old.values("registration_term").annotate(change_seq=Max("change_seq"))
+        for row in pruned:
+            found, created = ChangeFeedHorizon.objects.get_or_create(
+                registration_term=row["registration_term"],
+                defaults={"change_seq": row["change_seq"]},
+            )
+            if not created:
+                # Numbers follow commits and deleted_at the start of the
+                # transaction, an older tombstone may have a higher number
+                ChangeFeedHorizon.objects.filter(id=found.id).update(
+                    change_seq=Greatest("change_seq", row["change_seq"])
+                )
+        deleted, _ = old.delete()
+    return deleted
+
+
+def changes_since(registration_term, since, limit=PAGE_SIZE):
+    """
+    The first limit changes of the term numbered above since, in order, as
+    (change_seq, CourseDetails or None, crn) tuples, None for deletions.
+    Returns them and whether there are more.
+    """
+    updated = (
+        CourseDetails.objects.filter(
+            registration_term=registration_term, change_seq__gt=since
+        )
+        .order_by("change_seq")
+        .only("id", "crn", "change_seq", "document")[: limit + 1]
+    )
+    deleted = (
+        CourseDetailsTombstone.objects.filter(
+            registration_term=registration_term, change_seq__gt=since
+        )
+        .order_by("change_seq")
+        .values_list("change_seq", "crn")[: limit + 1]
+    )
+    changes = sorted(
+        [(course.change_seq, course, course.crn) for course in updated]
+        + [(change_seq, None, crn) for change_seq, crn in deleted],
+        key=lambda change: change[0],
+    )
+    return changes[:limit], len(changes) > limit
@@ -0,0 +1,96 @@
+"""
+Which terms a crawl visits, in what order, and when subject lists are
+refetched.
+
+Past terms can't change anymore, so once crawled they are only revisited
+every SCRAPE_PAST_TERM_INTERVAL (never if unset), while the current and
+upcoming terms are due every SCRAPE_OPEN_TERM_INTERVAL. The tasks of a term
+are queued with a Celery priority (0 is the highest with the Redis broker)
+so the current term is crawled before the others.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Subject, Term
+from .terms import term_code_for
+
+CURRENT_PRIORITY = 0
+UPCOMING_PRIORITY = 3
+PAST_PRIORITY = 9
+
+
+def is_past(term_code, today=None):
+    return term_code < term_code_for(today or datetime.date.today())
+
+
+def crawl_interval(term_code, today=None):
+    """Minimum time between two crawls of the term, None for never again."""
+    if is_past(term_code, today):
+        return settings.SCRAPE_PAST_TERM_INTERVAL
+    return settings.SCRAPE_OPEN_TERM_INTERVAL
+
+
+def crawl_priority(term_code, today=None):
+    current = term_code_for(today or datetime.date.today())
+    if term_code == current:
+        return CURRENT_PRIORITY
+    if term_code > current:
+        return UPCOMING_PRIORITY
+    return PAST_PRIORITY
+
+
+def is_due(term, now=None):
+    if term.last_scraped is None:
+        return True
+    interval = crawl_interval(term.term_code)
+    return interval is not None and (now or timezone.now()) >= (
+        term.last_scraped + interval
+    )
+
+
+def due_terms(term_codes, force=False):
+    """
+    Record the terms listed upstream and return the codes of those due for a
+    crawl, most urgent first.
+    """
+    Term.objects.bulk_create(
+        [Term(term_code=term_code) for term_code in term_codes],
+        ignore_conflicts=True,
+    )
+    terms = Term.objects.filter(term_code__in=term_codes)
+    due = [term.term_code for term in terms if force or is_due(term)]
+    return sorted(due, key=lambda term_code: (crawl_priority(term_code), term_code))
+
+
+def mark_scraped(term_code):
+    Term.objects.filter(term_code=term_code).update(last_scraped=timezone.now())
+
+
+def cached_subjects(term_code):
+    """
+    The stored subject list of the term, or None if it has to be refetched.
+    Past terms keep theirs for good.
+    """
+    term = Term.objects.filter(term_code=term_code).first()
+    if term is None or term.subjects_fetched is None:
+        return None
+    if not is_past(term_code):
+        if timezone.now() >= term.subjects_fetched + settings.SCRAPE_SUBJECTS_TTL:
+            return None
+    return list(term.subjects.order_by("code").values_list("code", flat=True))
+
+
+def store_subjects(term_code, subjects):
+    with transaction.atomic():
+        term, _ = Term.objects.get_or_create(term_code=term_code)
+        term.subjects.exclude(code__in=subjects).delete()
+        Subject.objects.bulk_create(
+            [Subject(term=term, code=code) for code in subjects],
+            ignore_conflicts=True,
+        )
+        term.subjects_fetched = timezone.now()
+        term.save(update_fields=["subjects_fetched"])
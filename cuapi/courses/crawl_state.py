@@ -0,0 +1,142 @@
+"""
+Coordination of term crawls: at most one crawl per term at a time, and a
+crawl that died part way is resumed instead of started over.
+
+A crawl holds a Redis lock on its term until the sweep that completes it.
+Each crawl is recorded as a CrawlRun. If the lock is free but the newest run
+of the term never finished (and started after the last complete crawl), the
+next crawl takes over its generation. Work already done under that
+generation is then skipped:
+
+- the CRN list of each subject is checkpointed in a Redis hash, so subjects
+  already searched aren't searched again;
+- CourseDetails stamped with the generation are stored already, so their
+  pages aren't fetched again.
+
+A crawl whose tasks failed keeps its lock until SCRAPE_CRAWL_LOCK_TTL
+expires, which must be longer than a crawl takes.
+"""
+
+import json
+import logging
+import uuid
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from .models import CourseDetails, CrawlRun, Term
+from .terms import registration_term
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "cuapi:crawl:{term}:lock"
+CRNS_KEY = "cuapi:crawl:{term}:{generation}:crns"
+# Checkpoints outlive the lock so an expired crawl can still be resumed
+CHECKPOINT_TTL = 7 * 24 * 3600
+
+# Only deletes the lock if it's still ours, it may have expired and been
+# taken by another crawl since
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def start_crawl(term_code, generation):
+    """
+    Take the term's crawl lock and return the generation to crawl it with,
+    generation unless an unfinished crawl is resumed. Returns None if another
+    crawl of the term is running.
+    """
+    token = uuid.uuid4().hex
+    client = get_client()
+    if not client.set(
+        LOCK_KEY.format(term=term_code),
+        token,
+        nx=True,
+        ex=settings.SCRAPE_CRAWL_LOCK_TTL,
+    ):
+        logger.info(f"Term {term_code} is being crawled already, skipping it")
+        return None
+
+    term = Term.objects.get(term_code=term_code)
+    unfinished = term.crawl_runs.filter(finished_at__isnull=True)
+    if term.last_scraped is not None:
+        unfinished = unfinished.filter(started_at__gt=term.last_scraped)
+    run = unfinished.order_by("-started_at").first()
+    if run is None:
+        CrawlRun.objects.create(term=term, generation=generation, lock_token=token)
+        return generation
+
+    logger.info(f"Resuming crawl {run.generation} of term {term_code}")
+    run.lock_token = token
+    run.resumed_at = timezone.now()
+    run.save(update_fields=["lock_token", "resumed_at"])
+    return run.generation
+
+
+def release_lock(term_code, generation):
+    run = CrawlRun.objects.filter(
+        term__term_code=term_code, generation=generation
+    ).first()
+    if run is not None:
+        client = get_client()
+        client.register_script(RELEASE_SCRIPT)(
+            [LOCK_KEY.format(term=term_code)], [run.lock_token]
+        )
+
+
+def finish_crawl(term_code, generation):
+    CrawlRun.objects.filter(term__term_code=term_code, generation=generation).update(
+        finished_at=timezone.now()
+    )
+    get_client().delete(CRNS_KEY.format(term=term_code, generation=generation))
+    release_lock(term_code, generation)
+
+
+def checkpointed_crns(term_code, generation, subject):
+    """The CRNs found for subject earlier in the crawl, None if not searched yet."""
+    crns = get_client().hget(
+        CRNS_KEY.format(term=term_code, generation=generation), subject
+    )
+    return json.loads(crns) if crns is not None else None
+
+
+def checkpoint_crns(term_code, generation, subject, crns):
+    key = CRNS_KEY.format(term=term_code, generation=generation)
+    client = get_client()
+    client.hset(key, subject, json.dumps(crns))
+    client.expire(key, CHECKPOINT_TTL)
+
+
+def stored_crns(term_code, crns, generation):
+    """The CRNs among crns already stored by the crawl of generation."""
+    return set(
+        CourseDetails.objects.filter(
+            registration_term=registration_term(term_code),
+            term_code=term_code,
+            crn__in=crns,
+            scrape_generation=generation,
+        ).values_list("crn", flat=True)
+    )
+
+
+def has_stored_crns(term_code, subject):
+    """Whether earlier crawls of the term stored CRNs of subject."""
+    return CourseDetails.objects.filter(
+        registration_term=registration_term(term_code),
+        term_code=term_code,
+        related_offering__startswith=f"{subject} ",
+    ).exists()
@@ -0,0 +1,171 @@
+"""
+Pre-serialized JSON documents of CourseDetails and Offerings.
+
+Course data only changes when a scrape is ingested, yet every search used to
+join an Offering to its sections and their course details and serialize the
+lot with model_to_dict. Instead the responses are stored, serialized, on the
+rows: CourseDetails.document and Offering.document, kept up to date by the
+ingest paths (courses/ingest.py) and the receivers for manual edits. The
+views only concatenate them.
+
+    CourseDetails.document  the row as /schedule/ returns it, minus the id
+    Offering.document       the offering as /query-offerings/ returns it
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import Offering
+from .versions import bump_on_commit
+
+# Fields of each object in the responses. Listed rather than taken from the
+# model so that a new column doesn't end up in the API unnoticed. Migration
+# 0015 has a copy of these as they were, keep it as it is.
+OFFERING_FIELDS = [
+    "id",
+    "related_offering",
+    "registration_term",
+    "description",
+    "long_title",
+    "short_title",
+    "search_vector",
+]
+SECTION_FIELDS = [
+    "registration_term",
+    "related_offering",
+    "section_key",
+    "description",
+    "long_title",
+    "short_title",
+    "subject_code",
+]
+COURSE_DETAILS_FIELDS = [
+    "registration_term",
+    "crn",
+    "subject_code",
+    "long_title",
+    "short_title",
+    "course_description",
+    "course_credit_value",
+    "schedule_type",
+    "registration_status",
+    "global_id",
+    "related_offering",
+    "section_key",
+    "section_information",
+    "meeting_details",
+]
+
+
+def dumps(data):
+    # Keys are sorted as JSONField values come back from the database in
+    # another order than they were stored in
+    return json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def fields_of(obj, fields):
+    return {field: getattr(obj, field) for field in fields}
+
+
+def course_details_document(course):
+    return dumps(fields_of(course, COURSE_DETAILS_FIELDS))
+
+
+def offering_document(offering):
+    """offering must come from a with_members queryset."""
+    data = fields_of(offering, OFFERING_FIELDS)
+    data["sections"] = [
+        {
+            **fields_of(section, SECTION_FIELDS),
+            "tutorials": [
+                fields_of(course, COURSE_DETAILS_FIELDS)
+                for course in section.tutorials.all()
+            ],
+            "lectures": [
+                fields_of(course, COURSE_DETAILS_FIELDS)
+                for course in section.lectures.all()
+            ],
+        }
+        for section in offering.sections.all()
+    ]
+    return dumps(data)
+
+
+def with_id(course):
+    """The /schedule/ JSON of a CourseDetails, null for None."""
+    if course is None:
+        return "null"
+    return f'{{"id": {course.id}, {course.document[1:]}'
+
+
+def join_documents(documents):
+    return "[" + ", ".join(documents) + "]"
+
+
+def schedules_document(schedules):
+    """The JSON of the ga.Schedules found by SectionScheduler.run."""
+    return join_documents(
+        '{"units": '
+        + join_documents(
+            f'{{"lecture": {with_id(unit.lecture)}, '
+            f'"tutorial": {with_id(unit.tutorial)}}}'
+            for unit in schedule.units
+        )
+        + "}"
+        for schedule in schedules
+    )
+
+
+def refresh_course_details_documents(course_details, batch_size=500):
+    """Regenerate the documents of a CourseDetails queryset."""
+    rows = list(course_details)
+    for course in rows:
+        course.document = course_details_document(course)
+    course_details.model.objects.bulk_update(rows, ["document"], batch_size=batch_size)
+    return len(rows)
+
+
+def with_members(offerings):
+    """
+    Prefetch what offering_document needs, ordered so that a document only
+    changes with its data.
+    """
+    section = offerings.model._meta.get_field("sections").related_model
+    course = section._meta.get_field("lectures").related_model
+    return offerings.prefetch_related(
+        Prefetch("sections", queryset=section.objects.order_by("id")),
+        Prefetch("sections__lectures", queryset=course.objects.order_by("id")),
+        Prefetch("sections__tutorials", queryset=course.objects.order_by("id")),
+    )
+
+
+def refresh_offering_documents(offerings, batch_size=500):
+    """Regenerate the documents of an Offering queryset."""
+    rows = list(with_members(offerings))
+    for offering in rows:
+        offering.document = offering_document(offering)
+    offerings.model.objects.bulk_update(rows, ["document"], batch_size=batch_size)
+    return len(rows)
+
+
+def refresh_offerings_of(course_details):
+    """
+    Regenerate the documents of the Offerings of CourseDetails rows, and the
+    data versions of their terms.
+    """
+    keys = {
+        (course.registration_term, course.related_offering) for course in course_details
+    }
+    terms = {term for term, _ in keys}
+    for registration_term in terms:
+        refresh_offering_documents(
+            Offering.objects.filter(
+                registration_term=registration_term,
+                related_offering__in=[
+                    offering for term, offering in keys if term == registration_term
+                ],
+            )
+        )
+    bump_on_commit(terms)
@@ -0,0 +1,113 @@
+"""
+A tiny HTTP server that replays recorded Carleton pages.
+
+Pages recorded with ``python -m courses.async_scraper --record DIR`` are
+stored under the key of the request that fetched them, so pointing a scraper
+at this server lets it crawl a fixed snapshot of the site without touching the
+network:
+
+    python -m courses.fixture_server DIR --port 8765
+    python -m courses.async_scraper --base-url http://127.0.0.1:8765/prod/
+
+FIXTURE_PAGES (courses/fixtures/pages) holds a small site for the tests and
+benchmarks: two terms of two subjects, each with two courses of a lecture and
+a tutorial, in the markup the parsers expect. It's served when DIR is left
+out.
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+FIXTURE_PAGES = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+
+def request_key(method, path, query="", body=""):
+    """
+    Identify a request by method, path and its (order-insensitive) query and
+    form parameters.
+    """
+    if isinstance(query, bytes):
+        query = query.decode()
+    if isinstance(body, bytes):
+        body = body.decode()
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    body = urlencode(sorted(parse_qsl(body, keep_blank_values=True)))
+    raw = f"{method.upper()} {path}?{query}\n{body}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def fixture_path(directory, key):
+    return os.path.join(directory, f"{key}.html")
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive, so clients exercise their connection pools
+    protocol_version = "HTTP/1.1"
+    directory = "."
+
+    def do_GET(self):
+        self.replay(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.replay(self.rfile.read(length))
+
+    def replay(self, body):
+        url = urlsplit(self.path)
+        key = request_key(self.command, url.path, url.query, body)
+        try:
+            with open(fixture_path(self.directory, key), "rb") as f:
+                page = f.read()
+        except FileNotFoundError:
+            self.send_error(404, f"No recorded page for {self.command} {self.path}")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, directory, host="127.0.0.1", port=0):
+        handler = type(
+            "Handler", (FixtureRequestHandler,), {"directory": str(directory)}
+        )
+        super().__init__((host, port), handler)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/prod/"
+
+    def start(self):
+        """Serve from a daemon thread, handy for tests and benchmarks."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", nargs="?", default=FIXTURE_PAGES)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = FixtureServer(args.directory, args.host, args.port)
+    print(f"Replaying {args.directory} on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from .models import CourseDetails, CourseSection, Offering
+from contextlib import contextmanager
 import random
+import time
 
 MUTATION_RATE = 0.1
 POPULATION_SIZE = 100
@@ -122,29 +124,91 @@ GENERATIONS = 100
 # });
 
 
+class SchedulerProfile:
+    """
+    What a SectionScheduler.run spent its time on: seconds per phase,
+    generations run, fitness evaluations and cache hits, and the best fitness
+    of every generation. Subclass it and override the on_* hooks to report
+    elsewhere as the run progresses.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.generations = 0
+        self.fitness_evaluations = 0
+        self.cache_hits = 0
+        self.best_fitness = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.on_phase(name, time.perf_counter() - start)
+
+    def on_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def on_fitness(self, cached):
+        if cached:
+            self.cache_hits += 1
+        else:
+            self.fitness_evaluations += 1
+
+    def on_generation(self, generation, best_fitness):
+        self.generations += 1
+        self.best_fitness.append(best_fitness)
+
+    def as_dict(self):
+        return {
+            "phases": self.phases,
+            "generations": self.generations,
+            "fitness_evaluations": self.fitness_evaluations,
+            "cache_hits": self.cache_hits,
+            "best_fitness": self.best_fitness,
+        }
+
+
 class ScheduleUnit:
-    def __init__(self, sections: list[CourseSection]):
+    def __init__(self, sections: list[CourseSection], pair=None):
         self.sections = sections
         self.tutorial = None
         self.lecture = None
-        self.select_pair()
+        if pair is None:
+            self.select_pair()
+        else:
+            self.tutorial, self.lecture = pair
 
     def select_pair(self):
+        # The sections' lectures and tutorials are prefetched
         section = random.choice(self.sections)
-        if section.tutorials.all():
-            self.tutorial = random.choice(list(section.tutorials.all()))
+        tutorials = list(section.tutorials.all())
+        self.tutorial = random.choice(tutorials) if tutorials else None
 
-        if section.lectures.all():
-            self.lecture = random.choice(list(section.lectures.all()))
+        lectures = list(section.lectures.all())
+        self.lecture = random.choice(lectures) if lectures else None
 
     def mutate(self):
         if random.random() < MUTATION_RATE:
             self.select_pair()
 
+    def copy(self):
+        return ScheduleUnit(self.sections, (self.tutorial, self.lecture))
+
+    def key(self):
+        return (
+            self.tutorial.id if self.tutorial else None,
+            self.lecture.id if self.lecture else None,
+        )
+
     def __str__(self):
         return f"{self.tutorial} - {self.lecture}"
 
 
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
 class Schedule:
     def __init__(self, units: list[ScheduleUnit]):
         self.units = units
@@ -155,20 +219,27 @@ class Schedule:
             if course is None:
                 continue
             for meeting in course.meeting_details:
-                print(meeting)
                 days = meeting["days"]
                 time = meeting["time"]
-                start = time.split("-")[0]
-                end = time.split("-")[1]
+                try:
+                    start = time.split("-")[0]
+                    end = time.split("-")[1]
 
-                start_hour = int(start.split(":")[0])
-                end_hour = int(end.split(":")[0])
+                    start_hour = int(start.split(":")[0])
+                    end_hour = int(end.split(":")[0])
 
-                start_minute = int(start.split(":")[0]) * 60 + int(start.split(":")[1])
-                end_minute = int(end.split(":")[0]) * 60 + int(end.split(":")[1])
+                    start_minute = int(start.split(":")[0]) * 60 + int(
+                        start.split(":")[1]
+                    )
+                    end_minute = int(end.split(":")[0]) * 60 + int(end.split(":")[1])
+                except (IndexError, ValueError):
+                    # No meeting time, e.g. online courses
+                    continue
 
                 for day in days:
-                    day_index = ["Mon", "Tue", "Wed", "Thu", "Fri"].index(day)
+                    if day not in WEEKDAYS:
+                        continue
+                    day_index = WEEKDAYS.index(day)
                     timestamps.append(
                         {
                             "startMinute": start_minute + 1440 * day_index,
@@ -195,11 +266,10 @@ class Schedule:
         conflicts_at_minute = [0] * minutes_in_week
         total_conflicts = 0
 
-        for _ in self.units:
-            for timestamp in self.convert_to_timestamps():
-                for minute in range(timestamp["startMinute"], timestamp["endMinute"]):
-                    conflicts_at_minute[minute] += 1
-                    total_conflicts += 1 if conflicts_at_minute[minute] > 1 else 0
+        for timestamp in self.convert_to_timestamps():
+            for minute in range(timestamp["startMinute"], timestamp["endMinute"]):
+                conflicts_at_minute[minute] += 1
+                total_conflicts += 1 if conflicts_at_minute[minute] > 1 else 0
 
         return total_conflicts
 
@@ -207,38 +277,73 @@ class Schedule:
         score = -100000 * self.calculate_conflicts()
         return score
 
+    def key(self):
+        """Identifies the chosen sections, schedules with equal keys are equally fit."""
+        return tuple(unit.key() for unit in self.units)
+
     def mutate(self):
         for unit in self.units:
             unit.mutate()
+        return self
 
     def __str__(self):
         return "\n".join(str(unit) for unit in self.units)
 
     def copy(self):
-        return Schedule([unit for unit in self.units])
+        return Schedule([unit.copy() for unit in self.units])
 
 
 # Genetic Algorithm
 class SectionScheduler:
-    def __init__(self, offerings: list[Offering]):
+    def __init__(self, offerings: list[Offering], profiler=None):
         self.offerings = offerings
-
-        units = []
-        for offering in offerings:
-            units.append(ScheduleUnit(list(offering.sections.all())))
-        self.population = [Schedule(units) for _ in range(POPULATION_SIZE)]
+        self.profiler = profiler or SchedulerProfile()
+        # Fitness of every schedule seen so far, by Schedule.key()
+        self.fitness_cache = {}
+
+        with self.profiler.phase("load_candidates"):
+            self.candidates = [
+                list(offering.sections.prefetch_related("lectures", "tutorials"))
+                for offering in offerings
+            ]
+
+        with self.profiler.phase("build_population"):
+            self.population = [
+                Schedule([ScheduleUnit(sections) for sections in self.candidates])
+                for _ in range(POPULATION_SIZE)
+            ]
+
+    def fitness(self, schedule):
+        key = schedule.key()
+        cached = key in self.fitness_cache
+        if not cached:
+            self.fitness_cache[key] = schedule.fitness()
+        self.profiler.on_fitness(cached)
+        return self.fitness_cache[key]
+
+    def rank(self):
+        with self.profiler.phase("fitness"):
+            scores = [self.fitness(schedule) for schedule in self.population]
+        with self.profiler.phase("selection"):
+            ranked = sorted(
+                zip(scores, self.population), key=lambda x: x[0], reverse=True
+            )
+            self.population = [schedule for _, schedule in ranked]
+        return ranked[0][0] if ranked else None
 
     def run(self):
-        for _ in range(GENERATIONS):
-            self.population.sort(key=lambda x: x.fitness(), reverse=True)
-            # split the population in half and keep the top half
-            self.population = self.population[: POPULATION_SIZE // 2]
-            # fill in the rest with new mutations
-            while len(self.population) < POPULATION_SIZE:
-                new_schedule = random.choice(self.population)
-                copy = new_schedule.copy().mutate()
-                self.population.append(copy)
-
-        self.population.sort(key=lambda x: x.fitness(), reverse=True)
+        for generation in range(GENERATIONS):
+            best_fitness = self.rank()
+            self.profiler.on_generation(generation, best_fitness)
+            with self.profiler.phase("mutation"):
+                # split the population in half and keep the top half
+                self.population = self.population[: POPULATION_SIZE // 2]
+                # fill in the rest with new mutations
+                while len(self.population) < POPULATION_SIZE:
+                    new_schedule = random.choice(self.population)
+                    copy = new_schedule.copy().mutate()
+                    self.population.append(copy)
+
+        self.rank()
         result_length = min(5, len(self.population) - 1)
         return self.population[:result_length]
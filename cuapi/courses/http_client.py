@@ -0,0 +1,112 @@
+"""
+Pooled HTTP session shared by the scrape tasks of a worker process.
+
+Calling requests.get/post directly opens a new TCP and TLS connection for
+every page. Instead each worker process lazily creates one keep-alive Session
+(after the prefork pool has forked, sessions must not be shared across
+processes) with retries, backoff and a default timeout. Requests go through
+the adaptive concurrency limit shared by all workers (courses/ratelimit.py).
+"""
+
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .carleton import endpoint
+from .metrics import HTTP_CONNECTIONS, HTTP_REQUESTS, RETRIES, observe_fetch
+from .ratelimit import get_shared_limiter
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_connections_seen = 0
+
+
+def build_session():
+    retries = Retry(
+        total=settings.SCRAPE_HTTP_RETRIES,
+        backoff_factor=settings.SCRAPE_HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # The schedule's POST endpoints are searches, safe to repeat
+        allowed_methods=None,
+        # Retry-After could be any length, the limiter's leases must outlive
+        # a request (ratelimit.request_seconds). A 429 still halves the limit.
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.SCRAPE_HTTP_POOL_SIZE,
+        pool_maxsize=settings.SCRAPE_HTTP_POOL_SIZE,
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    global _session, _session_pid, _connections_seen
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = build_session()
+            _session_pid = os.getpid()
+            _connections_seen = 0
+        return _session
+
+
+def connection_count(session):
+    """Total number of connections opened by the session's pools."""
+    total = 0
+    for adapter in session.adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_connections
+    return total
+
+
+def record_metrics(session, response):
+    global _connections_seen
+    HTTP_REQUESTS.labels(response.request.method, response.status_code).inc()
+    retries = getattr(response.raw, "retries", None)
+    if retries and retries.history:
+        RETRIES.labels("http").inc(len(retries.history))
+    with _lock:
+        opened = connection_count(session)
+        if opened > _connections_seen:
+            HTTP_CONNECTIONS.inc(opened - _connections_seen)
+        _connections_seen = opened
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault("timeout", settings.SCRAPE_HTTP_TIMEOUT)
+    session = get_session()
+
+    def send():
+        # Time spent waiting for the limiter isn't upstream latency
+        start = time.perf_counter()
+        response = session.request(method, url, **kwargs)
+        observe_fetch(endpoint(url), time.perf_counter() - start)
+        return response
+
+    if settings.SCRAPE_ADAPTIVE_CONCURRENCY:
+        # Concurrency across all workers adapts to how upstream copes
+        response = get_shared_limiter().call(send)
+    else:
+        response = send()
+    record_metrics(session, response)
+    return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, data=None, **kwargs):
+    return request("POST", url, data=data, **kwargs)
@@ -0,0 +1,325 @@
+"""
+Set-wise maintenance of the course tables.
+
+The post_save/post_delete receivers in models.py keep CourseSection and
+Offering in sync one CourseDetails row at a time, which is fine for the odd
+manual edit but far too chatty for a whole term. The helpers here do the same
+bookkeeping with a handful of statements per term.
+"""
+
+import logging
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Value
+
+from .changes import lock_change_feed
+from .documents import course_details_document, refresh_offerings_of
+from .meeting_slots import refresh_meeting_slots
+from .metrics import ROWS, UPSERT_SECONDS
+from .models import (
+    CourseDetails,
+    CourseSection,
+    MeetingSlot,
+    Offering,
+    offering_search_vector,
+)
+from .terms import SEASONS, registration_term
+
+logger = logging.getLogger(__name__)
+
+# Everything a scrape sets on a CourseDetails row
+COURSE_DETAILS_FIELDS = [
+    "registration_term",
+    "crn",
+    "subject_code",
+    "long_title",
+    "short_title",
+    "course_description",
+    "course_credit_value",
+    "schedule_type",
+    "registration_status",
+    "global_id",
+    "related_offering",
+    "section_key",
+    "section_information",
+    "meeting_details",
+]
+
+
+def new_scrape_generation():
+    """
+    Generations only need to increase between scrape runs, so the start time
+    in milliseconds is good enough.
+    """
+    return time.time_ns() // 1_000_000
+
+
+def sweep_stale_course_details(term_code, generation):
+    """
+    Delete the CourseDetails of term_code (e.g. 202430) that were last seen by
+    a scrape older than generation (i.e. sections that have been cancelled),
+    then delete the CourseSections and Offerings left without any members. The
+    documents of the remaining Offerings that lost sections are rebuilt.
+
+    Only rows stored with the term code are swept, those of other years of the
+    same season are left alone. This bypasses the post_delete receivers on
+    purpose, the aggregates are rebuilt here with one statement per table
+    instead.
+    """
+    if len(term_code) != 6 or term_code[-2:] not in SEASONS:
+        # A season letter would match the rows of every year of the season
+        raise ValueError(f"Not a term code: {term_code!r}")
+    season = registration_term(term_code)
+    lectures = CourseSection.lectures.through.objects
+    tutorials = CourseSection.tutorials.through.objects
+    offering_sections = Offering.sections.through.objects
+
+    with transaction.atomic():
+        # Before the through rows, see courses/changes.py
+        lock_change_feed()
+        stale = CourseDetails.objects.filter(
+            registration_term=season,
+            term_code=term_code,
+            scrape_generation__lt=generation,
+        )
+        stale_ids = stale.values("id")
+        # Offerings losing sections, their documents are rebuilt below
+        affected = list(stale.only("registration_term", "related_offering"))
+        lectures.filter(coursedetails_id__in=stale_ids).delete()
+        tutorials.filter(coursedetails_id__in=stale_ids).delete()
+        MeetingSlot.objects.filter(course_details_id__in=stale_ids).delete()
+        details_deleted = stale._raw_delete(stale.db)
+
+        empty_sections = CourseSection.objects.filter(
+            registration_term=season,
+            lectures__isnull=True,
+            tutorials__isnull=True,
+        )
+        empty_section_ids = list(empty_sections.values_list("id", flat=True))
+        offering_sections.filter(coursesection_id__in=empty_section_ids).delete()
+        empty_sections = CourseSection.objects.filter(id__in=empty_section_ids)
+        sections_deleted = empty_sections._raw_delete(empty_sections.db)
+
+        empty_offerings = Offering.objects.filter(
+            registration_term=season, sections__isnull=True
+        )
+        offerings_deleted = empty_offerings._raw_delete(empty_offerings.db)
+        refresh_offerings_of(affected)
+
+    logger.info(
+        f"Swept term {term_code} below generation {generation}: "
+        f"{details_deleted} course details, {sections_deleted} sections, "
+        f"{offerings_deleted} offerings"
+    )
+    return {
+        "course_details": details_deleted,
+        "sections": sections_deleted,
+        "offerings": offerings_deleted,
+    }
+
+
+def upsert_course_details(records, generation=None, term_code=None):
+    """
+    Insert or update CourseDetails from dicts of COURSE_DETAILS_FIELDS in a
+    handful of statements, then link the written rows into their CourseSection
+    and Offering aggregates and rebuild the documents of those Offerings. Rows
+    that didn't change are not rewritten, only stamped with the generation and
+    the code of the term the records were scraped from.
+
+    Returns the number of inserted, updated and unchanged rows.
+    """
+    start = time.perf_counter()
+    records = {(r["crn"], r["registration_term"]): r for r in records}
+    crns_by_term = defaultdict(list)
+    for crn, registration_term in records:
+        crns_by_term[registration_term].append(crn)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    with transaction.atomic():
+        existing = {}
+        for registration_term, crns in crns_by_term.items():
+            for course in CourseDetails.objects.filter(
+                registration_term=registration_term, crn__in=crns
+            ):
+                existing[(course.crn, course.registration_term)] = course
+
+        to_write = []
+        unchanged_ids = []
+        for key, record in records.items():
+            course = existing.get(key)
+            if course and all(
+                getattr(course, field) == record[field]
+                for field in COURSE_DETAILS_FIELDS
+            ):
+                counts["unchanged"] += 1
+                unchanged_ids.append(course.id)
+                continue
+
+            counts["updated" if course else "inserted"] += 1
+            fields = {field: record[field] for field in COURSE_DETAILS_FIELDS}
+            if generation is not None:
+                fields["scrape_generation"] = generation
+            if term_code is not None:
+                fields["term_code"] = term_code
+            course = CourseDetails(**fields)
+            course.document = course_details_document(course)
+            to_write.append(course)
+
+        update_fields = [
+            field
+            for field in COURSE_DETAILS_FIELDS
+            if field not in ("crn", "registration_term")
+        ]
+        update_fields.append("document")
+        stamp = {}
+        if generation is not None:
+            stamp["scrape_generation"] = generation
+        if term_code is not None:
+            stamp["term_code"] = term_code
+        update_fields.extend(stamp)
+        if to_write:
+            # Before the first row lock, see courses/changes.py
+            lock_change_feed()
+        written = CourseDetails.objects.bulk_create(
+            to_write,
+            update_conflicts=True,
+            unique_fields=["crn", "registration_term"],
+            update_fields=update_fields,
+        )
+        if stamp and unchanged_ids:
+            CourseDetails.objects.filter(id__in=unchanged_ids).update(**stamp)
+
+        link_course_details(written)
+        refresh_meeting_slots(written)
+        refresh_offerings_of(written)
+
+    UPSERT_SECONDS.observe(time.perf_counter() - start)
+    for result, count in counts.items():
+        ROWS.labels(result).inc(count)
+    return counts
+
+
+def link_course_details(course_details):
+    """
+    Set-wise equivalent of the update_course_section and update_offering
+    receivers: make sure every CourseDetails is a lecture or tutorial of its
+    CourseSection, and every CourseSection belongs to its Offering.
+    """
+    if not course_details:
+        return
+
+    sections = {}
+    for course in course_details:
+        key = (course.registration_term, course.related_offering, course.section_key)
+        sections.setdefault(
+            key,
+            CourseSection(
+                registration_term=course.registration_term,
+                related_offering=course.related_offering,
+                section_key=course.section_key,
+                long_title=course.long_title,
+                short_title=course.short_title,
+                subject_code=course.subject_code,
+                description=course.course_description,
+            ),
+        )
+    CourseSection.objects.bulk_create(sections.values(), ignore_conflicts=True)
+    # ignore_conflicts doesn't set primary keys, look them up
+    section_ids = {
+        (section.registration_term, section.related_offering, section.section_key): (
+            section.id
+        )
+        for section in CourseSection.objects.filter(
+            registration_term__in={key[0] for key in sections},
+            related_offering__in={key[1] for key in sections},
+        )
+    }
+
+    lectures, tutorials = [], []
+    for course in course_details:
+        section_id = section_ids[
+            (course.registration_term, course.related_offering, course.section_key)
+        ]
+        if course.is_lecture():
+            lectures.append(
+                CourseSection.lectures.through(
+                    coursesection_id=section_id, coursedetails_id=course.id
+                )
+            )
+        else:
+            tutorials.append(
+                CourseSection.tutorials.through(
+                    coursesection_id=section_id, coursedetails_id=course.id
+                )
+            )
+    CourseSection.lectures.through.objects.bulk_create(lectures, ignore_conflicts=True)
+    CourseSection.tutorials.through.objects.bulk_create(
+        tutorials, ignore_conflicts=True
+    )
+
+    offerings = {}
+    for section in sections.values():
+        key = (section.related_offering, section.registration_term)
+        offerings.setdefault(
+            key,
+            Offering(
+                related_offering=section.related_offering,
+                registration_term=section.registration_term,
+                long_title=section.long_title,
+                short_title=section.short_title,
+                description=section.description,
+                search_vector=offering_search_vector(
+                    Value(section.related_offering), Value(section.long_title)
+                ),
+            ),
+        )
+    Offering.objects.bulk_create(offerings.values(), ignore_conflicts=True)
+    offering_ids = {
+        (offering.related_offering, offering.registration_term): offering.id
+        for offering in Offering.objects.filter(
+            related_offering__in={key[0] for key in offerings},
+            registration_term__in={key[1] for key in offerings},
+        )
+    }
+    Offering.sections.through.objects.bulk_create(
+        [
+            Offering.sections.through(
+                offering_id=offering_ids[(key[1], key[0])],
+                coursesection_id=section_ids[key],
+            )
+            for key in sections
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def update_registration_statuses(registration_term, statuses):
+    """
+    Store the registration_status of CRNs (a map of CRN to status) in
+    registration_term, writing only the rows whose status changed. CRNs not
+    stored yet are left to the next full scrape. Returns the number of rows
+    updated.
+    """
+    rows = CourseDetails.objects.filter(
+        registration_term=registration_term, crn__in=list(statuses)
+    )
+    changed_crns = [
+        crn
+        for crn, status in rows.values_list("crn", "registration_status")
+        if status != statuses[crn]
+    ]
+    # Only the changed rows are loaded whole, to rebuild their documents
+    changed = list(rows.filter(crn__in=changed_crns))
+    for row in changed:
+        row.registration_status = statuses[row.crn]
+        row.document = course_details_document(row)
+    with transaction.atomic():
+        if changed:
+            lock_change_feed()
+        CourseDetails.objects.bulk_update(
+            changed, ["registration_status", "document"], batch_size=500
+        )
+        refresh_offerings_of(changed)
+    return len(changed)
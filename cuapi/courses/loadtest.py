@@ -0,0 +1,238 @@
+"""
+Closed-loop load test of the public API, to find how many concurrent
+students one backend serves before latency degrades.
+
+Each virtual user repeats one of two sessions without pause:
+
+- a search burst, typing a course code or title one keystroke at a time with
+  a /query-offerings/ request per prefix, as the search box does;
+- a /schedule/ request for a popular combination of courses. Combinations
+  are built from offerings found by searching and picked with Zipf weights,
+  so a few of them make most of the traffic.
+
+The test steps through increasing numbers of users and reports throughput
+and latency percentiles for every step.
+
+    python -m courses.loadtest --url http://127.0.0.1:3969 --users 1,4,16,64
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import quote
+
+import httpx
+
+from .stats import percentile
+
+# Real course codes and title searches, typed one prefix at a time
+SEARCHES = [
+    "COMP 1405",
+    "COMP 2804",
+    "MATH 1007",
+    "MATH 1104",
+    "STAT 2507",
+    "PHYS 1007",
+    "CHEM 1001",
+    "BIOL 1103",
+    "ECON 1000",
+    "PSYC 1001",
+    "BUSI 1001",
+    "SYSC 2006",
+    "introduction to",
+    "computer science",
+]
+
+
+def prefixes(query, shortest=2):
+    """What the search box sends while query is typed."""
+    return [query[:length] for length in range(shortest, len(query) + 1)]
+
+
+def summarize(samples, seconds):
+    """Request count, errors, throughput and percentiles of (ok, latency) samples."""
+    latencies = [latency for _, latency in samples]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for ok, _ in samples if not ok),
+        "per_second": len(samples) / seconds if seconds else 0.0,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+class LoadTest:
+    def __init__(
+        self,
+        url,
+        term,
+        searches=SEARCHES,
+        schedule_share=0.2,
+        combinations=50,
+        courses_per_schedule=(3, 5),
+        seed=0,
+        timeout=30.0,
+    ):
+        self.url = url.rstrip("/")
+        self.term = term
+        self.searches = searches
+        self.schedule_share = schedule_share
+        self.combination_count = combinations
+        self.courses_per_schedule = courses_per_schedule
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.combinations = []
+        self.weights = []
+        self.samples = {}
+
+    def search_path(self, query):
+        return f"/query-offerings/{quote(self.term, safe='')}/{quote(query, safe='')}/"
+
+    async def find_combinations(self, client):
+        """Build the popular course combinations from offerings found by search."""
+        ids = set()
+        for query in self.searches:
+            response = await client.get(self.search_path(query))
+            response.raise_for_status()
+            ids.update(offering["id"] for offering in response.json()[:10])
+        ids = sorted(ids)
+        if not ids:
+            return
+
+        low, high = self.courses_per_schedule
+        for _ in range(self.combination_count):
+            size = min(len(ids), self.rng.randint(low, high))
+            self.combinations.append(sorted(self.rng.sample(ids, size)))
+        # The n-th most popular combination is picked 1/n as often as the first
+        self.weights = [1 / rank for rank in range(1, len(self.combinations) + 1)]
+
+    async def request(self, client, kind, path, params=None):
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, params=params)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        self.samples[kind].append((ok, time.perf_counter() - start))
+
+    async def session(self, client):
+        if self.combinations and self.rng.random() < self.schedule_share:
+            ids = self.rng.choices(self.combinations, self.weights)[0]
+            await self.request(client, "schedule", "/schedule/", {"param": ids})
+        else:
+            for query in prefixes(self.rng.choice(self.searches)):
+                await self.request(client, "search", self.search_path(query))
+
+    async def user(self, client, deadline):
+        while time.perf_counter() < deadline:
+            await self.session(client)
+
+    async def step(self, users, seconds):
+        self.samples = {"search": [], "schedule": []}
+        limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+        async with httpx.AsyncClient(
+            base_url=self.url, limits=limits, timeout=self.timeout
+        ) as client:
+            start = time.perf_counter()
+            deadline = start + seconds
+            async with asyncio.TaskGroup() as tasks:
+                for _ in range(users):
+                    tasks.create_task(self.user(client, deadline))
+            elapsed = time.perf_counter() - start
+
+        result = {"users": users, "seconds": elapsed}
+        result["all"] = summarize(
+            self.samples["search"] + self.samples["schedule"], elapsed
+        )
+        for kind, samples in self.samples.items():
+            result[kind] = summarize(samples, elapsed)
+        return result
+
+    async def run(self, steps, seconds):
+        async with httpx.AsyncClient(base_url=self.url, timeout=self.timeout) as client:
+            await self.find_combinations(client)
+        return [await self.step(users, seconds) for users in steps]
+
+
+def report(results, p95_target=None):
+    header = f"{'users':>6} {'req/s':>8} {'errors':>7}"
+    for kind in ("all", "search", "schedule"):
+        header += f" {kind + ' p50/p95/p99 ms':>28}"
+    lines = [header]
+    for result in results:
+        line = (
+            f"{result['users']:>6} {result['all']['per_second']:>8.1f}"
+            f" {result['all']['errors']:>7}"
+        )
+        for kind in ("all", "search", "schedule"):
+            s = result[kind]
+            line += f" {s['p50_ms']:>8.0f} {s['p95_ms']:>9.0f} {s['p99_ms']:>9.0f}"
+        lines.append(line)
+
+    if p95_target is not None:
+        within = [
+            r
+            for r in results
+            if r["all"]["p95_ms"] <= p95_target and not r["all"]["errors"]
+        ]
+        if within:
+            best = max(within, key=lambda r: r["users"])
+            lines.append(
+                f"Capacity: {best['users']} users, {best['all']['per_second']:.1f}"
+                f" req/s within a p95 of {p95_target:.0f} ms"
+            )
+        else:
+            lines.append(f"No step stayed within a p95 of {p95_target:.0f} ms")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:3969")
+    parser.add_argument("--term", default="F", help="Registration term to search")
+    parser.add_argument(
+        "--users",
+        default="1,2,4,8,16,32,64",
+        help="Comma separated numbers of concurrent users, one step each",
+    )
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per step")
+    parser.add_argument(
+        "--search", action="append", dest="searches", help="Default: common courses"
+    )
+    parser.add_argument(
+        "--schedule-share",
+        type=float,
+        default=0.2,
+        help="Share of sessions requesting a schedule instead of searching",
+    )
+    parser.add_argument("--combinations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--p95-target", type=float, default=500.0, help="Latency budget in ms"
+    )
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    steps = [int(users) for users in args.users.split(",")]
+    test = LoadTest(
+        args.url,
+        args.term,
+        searches=args.searches or SEARCHES,
+        schedule_share=args.schedule_share,
+        combinations=args.combinations,
+        seed=args.seed,
+    )
+    results = asyncio.run(test.run(steps, args.duration))
+    print(report(results, args.p95_target))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
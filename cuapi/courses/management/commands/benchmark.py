@@ -0,0 +1,101 @@
+import datetime
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from courses.benchmarks import BENCHMARKS, regressions, run_benchmarks
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Run the courses benchmarks and print the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names", nargs="*", help=f"Benchmarks to run ({', '.join(BENCHMARKS)})"
+        )
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument(
+            "--fixtures",
+            help="Directory of recorded pages for parser benchmarks, by default "
+            "courses/fixtures/pages",
+        )
+        parser.add_argument(
+            "--subjects", type=int, default=20, help="Subjects of the catalog"
+        )
+        parser.add_argument(
+            "--crns", type=int, default=100, help="CRNs per subject of the catalog"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--batch-size", type=int, default=50, help="Course details per POST"
+        )
+        parser.add_argument(
+            "--disposable",
+            action="store_true",
+            help="Run against a new test database, dropped afterwards",
+        )
+        parser.add_argument("--output", help="Also write the results to this file")
+        parser.add_argument(
+            "--compare", help="Results of an earlier run to check for regressions"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.2,
+            help="p95 ratio to the compared run counted as a regression",
+        )
+
+    def handle(self, *args, **options):
+        names = options["names"]
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        benchmark_options = {
+            key: options[key]
+            for key in ("fixtures", "subjects", "crns", "seed", "batch_size")
+        }
+        if options["disposable"]:
+            database = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_benchmarks(names, options["iterations"], **benchmark_options)
+        finally:
+            if options["disposable"]:
+                connection.creation.destroy_test_db(database, verbosity=0)
+
+        report = {
+            "commit": current_commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "iterations": options["iterations"],
+            "options": benchmark_options,
+            "results": results,
+        }
+        self.stdout.write(json.dumps(report, indent=4))
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=4)
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            found = regressions(
+                baseline.get("results", {}), results, options["threshold"]
+            )
+            for name, before, after in found:
+                self.stderr.write(f"{name}: p95 {before:.2f} ms -> {after:.2f} ms")
+            if found:
+                raise CommandError(f"{len(found)} regressions")
@@ -0,0 +1,60 @@
+from itertools import groupby, islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.catalog import generate_catalog, term_codes
+from courses.ingest import (
+    new_scrape_generation,
+    sweep_stale_course_details,
+    upsert_course_details,
+)
+from courses.terms import registration_term
+
+
+class Command(BaseCommand):
+    help = (
+        "Store a synthetic catalog of terms × subjects × CRNs course details, "
+        "the same for the same seed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--terms", type=int, default=1)
+        parser.add_argument("--subjects", type=int, default=20)
+        parser.add_argument("--crns", type=int, default=100, help="Per subject")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete the other course details of the generated terms",
+        )
+
+    def handle(self, *args, **options):
+        # CourseDetails only store the season of a term
+        if not 1 <= options["terms"] <= 3:
+            raise CommandError("--terms must be between 1 and 3")
+        # CRNs are numbered within their subject with 4 digits
+        if not 1 <= options["crns"] <= 9999:
+            raise CommandError("--crns must be between 1 and 9999")
+
+        generation = new_scrape_generation()
+        codes = {
+            registration_term(term_code): term_code
+            for term_code in term_codes(options["terms"])
+        }
+        records = generate_catalog(
+            options["terms"], options["subjects"], options["crns"], options["seed"]
+        )
+        totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+        # The records of a term come one after the other
+        for season, term_records in groupby(records, lambda r: r["registration_term"]):
+            while batch := list(islice(term_records, options["batch_size"])):
+                counts = upsert_course_details(batch, generation, codes[season])
+                for key, count in counts.items():
+                    totals[key] += count
+
+        if options["replace"]:
+            for term_code in codes.values():
+                sweep_stale_course_details(term_code, generation)
+
+        self.stdout.write(", ".join(f"{count} {key}" for key, count in totals.items()))
@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.archive import PageArchive, latest
+from courses.ingest import sweep_stale_course_details, upsert_course_details
+from courses.parser import parse_course_details
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-parse the course pages archived for a term and ingest them again, "
+        "without any network access"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("term", help="Term code, e.g. 202430")
+        parser.add_argument(
+            "--generation", type=int, help="Archive to replay (default: latest)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument(
+            "--sweep",
+            action="store_true",
+            help="Afterwards delete rows of the term that are not in the archive",
+        )
+
+    def handle(self, *args, **options):
+        term = options["term"]
+        if options["generation"]:
+            archive = PageArchive(term, options["generation"])
+        else:
+            archive = latest(term)
+        if archive is None:
+            raise CommandError(f"No archive for term {term}")
+
+        pages = (content for _, content in archive.pages("course"))
+        totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+        processes = options["processes"]
+        # A single process parses in this one, without a pool
+        pool = ProcessPoolExecutor(processes) if processes > 1 else nullcontext()
+        with pool as executor:
+            if executor is not None:
+                parsed = executor.map(parse_course_details, pages, chunksize=32)
+            else:
+                parsed = map(parse_course_details, pages)
+
+            for records in batched(filter(None, parsed), options["chunk_size"]):
+                counts = upsert_course_details(records, archive.generation, term)
+                for key, count in counts.items():
+                    totals[key] += count
+
+        if options["sweep"]:
+            sweep_stale_course_details(term, archive.generation)
+
+        self.stdout.write(
+            f"Replayed term {term} generation {archive.generation}: "
+            + ", ".join(f"{count} {key}" for key, count in totals.items())
+        )
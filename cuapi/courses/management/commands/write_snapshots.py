@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Offering
+from courses.snapshots import write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write the catalog snapshots of terms, see courses/snapshots.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "terms", nargs="*", help="Registration terms (default: every stored one)"
+        )
+
+    def handle(self, *args, **options):
+        terms = options["terms"] or sorted(
+            Offering.objects.values_list("registration_term", flat=True).distinct()
+        )
+        for term in terms:
+            manifest = write_snapshot(term)
+            self.stdout.write(
+                f"{term}: {manifest['url']} ({manifest['compressed_size']} bytes)"
+            )
@@ -0,0 +1,125 @@
+"""
+Meeting times as ranges of week minutes, for filtering sections by when they
+meet in SQL.
+
+Every meeting of a CourseDetails is stored as a MeetingSlot per day it's on,
+its minutes the int4range [start, end) counted from Monday 00:00, e.g. a
+Tuesday 10:05 - 11:25 meeting is [2045, 2125). The ingest paths rebuild the
+slots of the rows they write.
+
+A section fits a time window filter if none of its slots overlaps the minutes
+the filter excludes, which is one && test against a GiST index:
+
+    GET /sections-in-window/?term=F&subject=COMP&days=Tue,Thu&allow=10:00-16:00
+
+only matches COMP sections meeting on Tuesdays and Thursdays between 10:00
+and 16:00, and forbid=12:00-13:00 would leave out those meeting over lunch.
+Sections without a meeting time, e.g. online ones, never match.
+"""
+
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import Q
+
+from .ga import WEEKDAYS
+from .models import CourseDetails, MeetingSlot
+
+MINUTES_IN_DAY = 24 * 60
+MINUTES_IN_WEEK = 7 * MINUTES_IN_DAY
+
+
+def parse_time_range(text):
+    """Minutes since midnight of "HH:MM - HH:MM", raises ValueError."""
+    start, end = (
+        int(hours) * 60 + int(minutes)
+        for hours, minutes in (part.strip().split(":") for part in text.split("-"))
+    )
+    if not 0 <= start < end <= MINUTES_IN_DAY:
+        raise ValueError(f"Not a time range: {text}")
+    return start, end
+
+
+def meeting_ranges(meeting_details):
+    """The (start, end) week minutes of a CourseDetails.meeting_details."""
+    ranges = set()
+    for meeting in meeting_details:
+        try:
+            start, end = parse_time_range(meeting["time"])
+        except ValueError:
+            # No meeting time, e.g. online courses
+            continue
+        for day in meeting["days"]:
+            if day in WEEKDAYS:
+                offset = WEEKDAYS.index(day) * MINUTES_IN_DAY
+                ranges.add((offset + start, offset + end))
+    return sorted(ranges)
+
+
+def refresh_meeting_slots(course_details):
+    """Rebuild the MeetingSlots of saved CourseDetails rows."""
+    MeetingSlot.objects.filter(
+        course_details_id__in=[course.id for course in course_details]
+    ).delete()
+    MeetingSlot.objects.bulk_create(
+        MeetingSlot(
+            course_details_id=course.id,
+            registration_term=course.registration_term,
+            minutes=NumericRange(start, end),
+        )
+        for course in course_details
+        for start, end in meeting_ranges(course.meeting_details)
+    )
+
+
+def complement(ranges):
+    """The week minutes outside of (start, end) ranges."""
+    gaps = []
+    covered_to = 0
+    for start, end in sorted(ranges):
+        if start > covered_to:
+            gaps.append((covered_to, start))
+        covered_to = max(covered_to, end)
+    if covered_to < MINUTES_IN_WEEK:
+        gaps.append((covered_to, MINUTES_IN_WEEK))
+    return gaps
+
+
+def excluded_ranges(days=None, allow=None, forbid=None):
+    """
+    The week minutes a section must not meet in to fit: those outside the
+    allowed (start, end) windows on the allowed days, and the forbidden
+    windows on any day. None allows every day or the whole day.
+    """
+    days = range(len(WEEKDAYS)) if days is None else days
+    allow = [(0, MINUTES_IN_DAY)] if allow is None else allow
+    allowed = [
+        (day * MINUTES_IN_DAY + start, day * MINUTES_IN_DAY + end)
+        for day in days
+        for start, end in allow
+    ]
+    forbidden = [
+        (day * MINUTES_IN_DAY + start, day * MINUTES_IN_DAY + end)
+        for day in range(len(WEEKDAYS))
+        for start, end in forbid or []
+    ]
+    return complement(allowed) + forbidden
+
+
+def sections_in_window(registration_term, days=None, allow=None, forbid=None):
+    """
+    The CourseDetails of registration_term meeting only on days (indexes into
+    WEEKDAYS), within the allowed windows and outside the forbidden ones, as
+    (start, end) minutes since midnight.
+    """
+    overlapping = Q()
+    for start, end in excluded_ranges(days, allow, forbid):
+        overlapping |= Q(minutes__overlap=NumericRange(start, end))
+    slots = MeetingSlot.objects.filter(registration_term=registration_term)
+    sections = CourseDetails.objects.filter(
+        registration_term=registration_term,
+        id__in=slots.values("course_details_id"),
+    )
+    if overlapping:
+        sections = sections.exclude(
+            id__in=slots.filter(overlapping).values("course_details_id")
+        )
+    return sections
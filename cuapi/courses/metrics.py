@@ -0,0 +1,149 @@
+"""
+Prometheus metrics for the scrape pipeline and the API.
+
+Celery's prefork pool runs tasks in several processes. Workers are started
+with PROMETHEUS_MULTIPROC_DIR set, so every process writes its samples there
+and the worker's main process serves them merged on SCRAPE_METRICS_PORT (see
+cuapi/celery.py). The scraper CLIs serve theirs with --metrics-port and the
+API on /metrics/ to holders of METRICS_TOKEN (see courses/middleware.py).
+"""
+
+import os
+import time
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+
+HTTP_REQUESTS = Counter(
+    "cuapi_scrape_http_requests_total",
+    "Requests sent to the upstream course schedule",
+    ["method", "status"],
+)
+HTTP_CONNECTIONS = Counter(
+    "cuapi_scrape_http_connections_total",
+    "New TCP/TLS connections opened to the upstream course schedule",
+)
+PAGES = Counter(
+    "cuapi_scrape_pages_total",
+    "Pages fetched from upstream, by endpoint (landing/subjects/search/course)",
+    ["endpoint"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "cuapi_scrape_upstream_latency_seconds",
+    "Time to fetch one page from upstream, including retries",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+PARSE_SECONDS = Histogram(
+    "cuapi_scrape_parse_seconds",
+    "Time to parse one page",
+    ["endpoint"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+UPSERT_SECONDS = Histogram(
+    "cuapi_scrape_upsert_seconds",
+    "Time to store one batch of course details",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+ROWS = Counter(
+    "cuapi_scrape_rows_total",
+    "CourseDetails rows stored, by result (inserted/updated/unchanged)",
+    ["result"],
+)
+RETRIES = Counter(
+    "cuapi_scrape_retries_total",
+    "Repeated requests to upstream, by reason (http: failed attempt retried, "
+    "session: session id rejected)",
+    ["reason"],
+)
+CONCURRENCY_LIMIT = Gauge(
+    "cuapi_scrape_concurrency_limit",
+    "Adaptive limit on requests in flight to upstream",
+    multiprocess_mode="mostrecent",
+)
+
+
+REQUEST_SECONDS = Histogram(
+    "cuapi_http_request_seconds",
+    "Time to handle an API request",
+    ["view", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    "cuapi_http_request_db_queries",
+    "DB queries run to handle an API request",
+    ["view"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "cuapi_http_request_db_seconds",
+    "Time spent in DB queries to handle an API request",
+    ["view"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+REQUEST_SERIALIZE_SECONDS = Histogram(
+    "cuapi_http_request_serialize_seconds",
+    "Time spent serializing an API response, without DB queries",
+    ["view"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+RESPONSE_BYTES = Histogram(
+    "cuapi_http_response_bytes",
+    "Size of API response bodies",
+    ["view"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+SCHEDULER_PHASE_SECONDS = Histogram(
+    "cuapi_scheduler_phase_seconds",
+    "Time a /schedule/ request spent per scheduler phase",
+    ["phase"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SCHEDULER_FITNESS = Counter(
+    "cuapi_scheduler_fitness_total",
+    "Fitness lookups of the scheduler, by result (computed/cached)",
+    ["result"],
+)
+
+
+def observe_scheduler_profile(profile):
+    for phase, seconds in profile.phases.items():
+        SCHEDULER_PHASE_SECONDS.labels(phase).observe(seconds)
+    SCHEDULER_FITNESS.labels("computed").inc(profile.fitness_evaluations)
+    SCHEDULER_FITNESS.labels("cached").inc(profile.cache_hits)
+
+
+def observe_fetch(endpoint, seconds):
+    PAGES.labels(endpoint).inc()
+    UPSTREAM_LATENCY.labels(endpoint).observe(seconds)
+
+
+def timed(fn, *args):
+    """
+    Call fn(*args), returns its result and the seconds it took. Module level
+    so it can be submitted to process pools, whose samples would be lost.
+    """
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def collector_registry():
+    """The registry to expose, merged across processes in multiprocess mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def start_metrics_server(port):
+    start_http_server(port, registry=collector_registry())
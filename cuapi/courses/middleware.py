@@ -0,0 +1,94 @@
+"""
+Per-request instrumentation of the API: latency, DB queries and DB time,
+serialization time and response size per view. They're exported as
+Prometheus metrics on /metrics/ and as a Server-Timing header, so the
+breakdown of a request also shows in the browser's devtools. Views can add
+their own entries to the header in request.server_timing, a map of name to
+seconds.
+"""
+
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .metrics import (
+    REQUEST_DB_SECONDS,
+    REQUEST_QUERIES,
+    REQUEST_SECONDS,
+    REQUEST_SERIALIZE_SECONDS,
+    RESPONSE_BYTES,
+)
+
+
+class QueryTimer:
+    """connection.execute_wrapper counting the queries run and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+@contextmanager
+def timed_serialization(request):
+    """
+    Count the block as serialization time of the request. Querysets are lazy,
+    so the queries run by the block are left out, they're DB time.
+    """
+    timer = getattr(request, "query_timer", None)
+    db_seconds = timer.seconds if timer else 0.0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if timer:
+            seconds -= timer.seconds - db_seconds
+        request.serialize_seconds = getattr(request, "serialize_seconds", 0) + seconds
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_timer = timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else "unmatched"
+        serialize_seconds = getattr(request, "serialize_seconds", 0.0)
+        REQUEST_SECONDS.labels(view, request.method, response.status_code).observe(
+            seconds
+        )
+        REQUEST_QUERIES.labels(view).observe(timer.count)
+        REQUEST_DB_SECONDS.labels(view).observe(timer.seconds)
+        REQUEST_SERIALIZE_SECONDS.labels(view).observe(serialize_seconds)
+        if not response.streaming:
+            RESPONSE_BYTES.labels(view).observe(len(response.content))
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={timer.seconds * 1000:.1f};desc="{timer.count} queries"',
+                f"serialize;dur={serialize_seconds * 1000:.1f}",
+                *(
+                    f"{name};dur={phase_seconds * 1000:.1f}"
+                    for name, phase_seconds in getattr(
+                        request, "server_timing", {}
+                    ).items()
+                ),
+                f"total;dur={seconds * 1000:.1f}",
+            ]
+        )
+        return response
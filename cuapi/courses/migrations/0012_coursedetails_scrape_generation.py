@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_auto_20240607_0304'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedetails',
+            name='scrape_generation',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='coursedetails',
+            index=models.Index(fields=['registration_term', 'scrape_generation'], name='courses_cou_registr_199b5b_idx'),
+        ),
+    ]
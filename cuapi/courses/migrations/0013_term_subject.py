@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_coursedetails_scrape_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Term',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term_code', models.CharField(max_length=6, unique=True)),
+                ('last_scraped', models.DateTimeField(blank=True, null=True)),
+                ('subjects_fetched', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Subject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subjects', to='courses.term')),
+            ],
+            options={
+                'unique_together': {('term', 'code')},
+            },
+        ),
+    ]
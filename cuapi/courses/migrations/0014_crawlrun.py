@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_term_subject'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField()),
+                ('lock_token', models.CharField(max_length=32)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('resumed_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='crawl_runs', to='courses.term')),
+            ],
+            options={
+                'unique_together': {('term', 'generation')},
+            },
+        ),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.0.6 on 2026-10-19 12:57
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+from django.db.models import Prefetch
+
+# Frozen copy of courses/documents.py as of this migration, the live module
+# follows the current models
+OFFERING_FIELDS = [
+    "id",
+    "related_offering",
+    "registration_term",
+    "description",
+    "long_title",
+    "short_title",
+    "search_vector",
+]
+SECTION_FIELDS = [
+    "registration_term",
+    "related_offering",
+    "section_key",
+    "description",
+    "long_title",
+    "short_title",
+    "subject_code",
+]
+COURSE_DETAILS_FIELDS = [
+    "registration_term",
+    "crn",
+    "subject_code",
+    "long_title",
+    "short_title",
+    "course_description",
+    "course_credit_value",
+    "schedule_type",
+    "registration_status",
+    "global_id",
+    "related_offering",
+    "section_key",
+    "section_information",
+    "meeting_details",
+]
+
+
+def dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def fields_of(obj, fields):
+    return {field: getattr(obj, field) for field in fields}
+
+
+def offering_document(offering):
+    data = fields_of(offering, OFFERING_FIELDS)
+    data["sections"] = [
+        {
+            **fields_of(section, SECTION_FIELDS),
+            "tutorials": [
+                fields_of(course, COURSE_DETAILS_FIELDS)
+                for course in section.tutorials.all()
+            ],
+            "lectures": [
+                fields_of(course, COURSE_DETAILS_FIELDS)
+                for course in section.lectures.all()
+            ],
+        }
+        for section in offering.sections.all()
+    ]
+    return dumps(data)
+
+
+def build_documents(apps, schema_editor):
+    CourseDetails = apps.get_model("courses", "CourseDetails")
+    CourseSection = apps.get_model("courses", "CourseSection")
+    Offering = apps.get_model("courses", "Offering")
+
+    rows = list(CourseDetails.objects.all())
+    for course in rows:
+        course.document = dumps(fields_of(course, COURSE_DETAILS_FIELDS))
+    CourseDetails.objects.bulk_update(rows, ["document"], batch_size=500)
+
+    rows = list(
+        Offering.objects.prefetch_related(
+            Prefetch("sections", queryset=CourseSection.objects.order_by("id")),
+            Prefetch(
+                "sections__lectures", queryset=CourseDetails.objects.order_by("id")
+            ),
+            Prefetch(
+                "sections__tutorials", queryset=CourseDetails.objects.order_by("id")
+            ),
+        )
+    )
+    for offering in rows:
+        offering.document = offering_document(offering)
+    Offering.objects.bulk_update(rows, ["document"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_crawlrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedetails',
+            name='document',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='offering',
+            name='document',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
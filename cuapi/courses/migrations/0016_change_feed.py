@@ -0,0 +1,88 @@
+# Generated by Django 5.0.6 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+# See courses/changes.py
+CHANGE_FEED_SQL = """
+CREATE SEQUENCE courses_change_seq;
+UPDATE courses_coursedetails SET change_seq = nextval('courses_change_seq');
+
+-- Held until commit, so sequence numbers are handed out in commit order
+CREATE FUNCTION courses_next_change_seq() RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(4901);
+    RETURN nextval('courses_change_seq');
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION courses_coursedetails_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.document IS DISTINCT FROM OLD.document THEN
+        NEW.change_seq := courses_next_change_seq();
+    ELSE
+        NEW.change_seq := OLD.change_seq;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION courses_coursedetails_deleted() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO courses_coursedetailstombstone
+        (registration_term, crn, change_seq, deleted_at)
+    VALUES
+        (OLD.registration_term, OLD.crn, courses_next_change_seq(), now());
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER courses_coursedetails_changed
+    BEFORE INSERT OR UPDATE ON courses_coursedetails
+    FOR EACH ROW EXECUTE FUNCTION courses_coursedetails_changed();
+CREATE TRIGGER courses_coursedetails_deleted
+    AFTER DELETE ON courses_coursedetails
+    FOR EACH ROW EXECUTE FUNCTION courses_coursedetails_deleted();
+"""
+
+REVERSE_CHANGE_FEED_SQL = """
+DROP TRIGGER courses_coursedetails_deleted ON courses_coursedetails;
+DROP TRIGGER courses_coursedetails_changed ON courses_coursedetails;
+DROP FUNCTION courses_coursedetails_deleted();
+DROP FUNCTION courses_coursedetails_changed();
+DROP FUNCTION courses_next_change_seq();
+DROP SEQUENCE courses_change_seq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDetailsTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registration_term', models.CharField(max_length=100)),
+                ('crn', models.CharField(max_length=100)),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='coursedetails',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='coursedetails',
+            index=models.Index(fields=['registration_term', 'change_seq'], name='courses_cou_registr_d905ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursedetailstombstone',
+            index=models.Index(fields=['registration_term', 'change_seq'], name='courses_cou_registr_2b53d4_idx'),
+        ),
+        migrations.RunSQL(CHANGE_FEED_SQL, REVERSE_CHANGE_FEED_SQL),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.6 on 2026-10-19 13:09
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.backends.postgresql.psycopg_any import NumericRange
+
+
+# Frozen copy of courses/meeting_slots.py as of this migration
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MINUTES_IN_DAY = 24 * 60
+
+
+def parse_time_range(text):
+    start, end = (
+        int(hours) * 60 + int(minutes)
+        for hours, minutes in (part.strip().split(":") for part in text.split("-"))
+    )
+    if not 0 <= start < end <= MINUTES_IN_DAY:
+        raise ValueError(f"Not a time range: {text}")
+    return start, end
+
+
+def meeting_ranges(meeting_details):
+    ranges = set()
+    for meeting in meeting_details:
+        try:
+            start, end = parse_time_range(meeting["time"])
+        except ValueError:
+            continue
+        for day in meeting["days"]:
+            if day in WEEKDAYS:
+                offset = WEEKDAYS.index(day) * MINUTES_IN_DAY
+                ranges.add((offset + start, offset + end))
+    return sorted(ranges)
+
+
+def build_meeting_slots(apps, schema_editor):
+    MeetingSlot = apps.get_model("courses", "MeetingSlot")
+    course_details = apps.get_model("courses", "CourseDetails").objects.only(
+        "registration_term", "meeting_details"
+    )
+    MeetingSlot.objects.bulk_create(
+        (
+            MeetingSlot(
+                course_details_id=course.id,
+                registration_term=course.registration_term,
+                minutes=NumericRange(start, end),
+            )
+            for course in course_details.iterator()
+            for start, end in meeting_ranges(course.meeting_details)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeetingSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registration_term', models.CharField(max_length=100)),
+                ('minutes', django.contrib.postgres.fields.ranges.IntegerRangeField()),
+                ('course_details', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meeting_slots', to='courses.coursedetails')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GistIndex(fields=['minutes'], name='courses_mee_minutes_b95870_gist')],
+            },
+        ),
+        migrations.RunPython(build_meeting_slots, migrations.RunPython.noop),
+    ]
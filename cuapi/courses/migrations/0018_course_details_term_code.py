@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-19 13:20
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_term_codes(apps, schema_editor):
+    # Rows were stamped with the generation of the crawl that stored them last.
+    # The crawls of one scrape run share a generation, so a season and
+    # generation only identify a term if a single term of that season was
+    # crawled with it. Other rows are left without a term code, and are never
+    # swept.
+    from courses.terms import registration_term
+
+    CourseDetails = apps.get_model("courses", "CourseDetails")
+    CrawlRun = apps.get_model("courses", "CrawlRun")
+    runs = defaultdict(set)
+    for term_code, generation in CrawlRun.objects.values_list(
+        "term__term_code", "generation"
+    ):
+        runs[(registration_term(term_code), generation)].add(term_code)
+    for (season, generation), term_codes in runs.items():
+        if len(term_codes) == 1:
+            CourseDetails.objects.filter(
+                registration_term=season, scrape_generation=generation
+            ).update(term_code=term_codes.pop())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_meeting_slots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedetails',
+            name='term_code',
+            field=models.CharField(blank=True, default='', max_length=6),
+        ),
+        migrations.AddIndex(
+            model_name='coursedetails',
+            index=models.Index(fields=['term_code', 'scrape_generation'], name='courses_cou_term_co_99fa9f_idx'),
+        ),
+        migrations.RunPython(backfill_term_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-19 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_course_details_term_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeFeedHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registration_term', models.CharField(max_length=100, unique=True)),
+                ('change_seq', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -8,7 +8,9 @@ from django.contrib.postgres.search import (
     TrigramSimilarity,
     SearchVectorField,
 )
-from django.db.models import Q
+from django.contrib.postgres.fields import IntegerRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.db.models import Q, Value
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,6 +32,17 @@ class CourseDetails(models.Model):
     section_information = models.JSONField()
     meeting_details = models.JSONField()
 
+    # Id of the last scrape run that saw this CRN, see ingest.sweep_stale_course_details
+    scrape_generation = models.BigIntegerField(default=0)
+    # Term code of that run, e.g. 202430. registration_term only holds the
+    # season, which terms of different years share.
+    term_code = models.CharField(max_length=6, blank=True, default="")
+
+    # Serialized JSON of the row, see courses/documents.py
+    document = models.TextField(default="", editable=False)
+    # Set by a database trigger when the document changes, see courses/changes.py
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
     def __str__(self):
         return str(self.long_title)
 
@@ -55,6 +68,58 @@ class CourseDetails(models.Model):
 
     class Meta:
         unique_together = ("crn", "registration_term")
+        indexes = [
+            models.Index(fields=["registration_term", "scrape_generation"]),
+            models.Index(fields=["term_code", "scrape_generation"]),
+            models.Index(fields=["registration_term", "change_seq"]),
+        ]
+
+
+class CourseDetailsTombstone(models.Model):
+    """A deleted CourseDetails row, written by a database trigger"""
+
+    registration_term = models.CharField(max_length=100)
+    crn = models.CharField(max_length=100)
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.registration_term} {self.crn}"
+
+    class Meta:
+        indexes = [models.Index(fields=["registration_term", "change_seq"])]
+
+
+class ChangeFeedHorizon(models.Model):
+    """
+    Highest change_seq of the pruned tombstones of a registration term, a
+    client that synced below it may have missed deletions
+    """
+
+    registration_term = models.CharField(max_length=100, unique=True)
+    change_seq = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.registration_term} {self.change_seq}"
+
+
+class MeetingSlot(models.Model):
+    """
+    When a CourseDetails meets, in minutes since Monday 00:00, one row per day
+    of each meeting, see courses/meeting_slots.py
+    """
+
+    course_details = models.ForeignKey(
+        CourseDetails, on_delete=models.CASCADE, related_name="meeting_slots"
+    )
+    registration_term = models.CharField(max_length=100)
+    minutes = IntegerRangeField()
+
+    def __str__(self):
+        return f"{self.course_details_id} {self.minutes}"
+
+    class Meta:
+        indexes = [GistIndex(fields=["minutes"])]
 
 
 class CourseSection(models.Model):
@@ -79,6 +144,18 @@ class CourseSection(models.Model):
         unique_together = ("registration_term", "related_offering", "section_key")
 
 
+def offering_search_vector(
+    related_offering="related_offering", long_title="long_title"
+):
+    """
+    The weighted search vector stored on an Offering. Arguments may be column
+    names (for UPDATEs) or Value expressions (for INSERTs).
+    """
+    return SearchVector(related_offering, weight="A") + SearchVector(
+        long_title, weight="C"
+    )
+
+
 class Offering(models.Model):
     related_offering = models.CharField(max_length=100)
     registration_term = models.CharField(max_length=100)
@@ -92,22 +169,66 @@ class Offering(models.Model):
 
     search_vector = SearchVectorField(null=True)
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+    # Serialized JSON of the offering and its sections, see courses/documents.py
+    document = models.TextField(default="", editable=False)
 
-        # check if search_vector is None
+    def save(self, *args, **kwargs):
+        # Compute the search vector as part of the same INSERT/UPDATE rather
+        # than saving, refetching and saving again. Column references can't be
+        # used in an INSERT, so the vector is built from the instance values.
         if self.search_vector is None:
-            offering = Offering.objects.get(pk=self.pk)
-            offering.search_vector = SearchVector(
-                SearchVector("related_offering", weight="A")
-                + SearchVector("long_title", weight="C")
+            self.search_vector = offering_search_vector(
+                Value(self.related_offering), Value(self.long_title)
             )
-            offering.save()
+        super().save(*args, **kwargs)
 
     class Meta:
         unique_together = ("related_offering", "registration_term")
 
 
+class Term(models.Model):
+    """A term listed upstream, with the crawl bookkeeping of courses/crawl_policy.py"""
+
+    term_code = models.CharField(max_length=6, unique=True)
+    # When the last complete crawl of the term finished
+    last_scraped = models.DateTimeField(null=True, blank=True)
+    # When the Subjects below were fetched
+    subjects_fetched = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.term_code
+
+
+class Subject(models.Model):
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name="subjects")
+    code = models.CharField(max_length=20)
+
+    def __str__(self):
+        return f"{self.term} {self.code}"
+
+    class Meta:
+        unique_together = ("term", "code")
+
+
+class CrawlRun(models.Model):
+    """One crawl of a term, see courses/crawl_state.py"""
+
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name="crawl_runs")
+    # Scrape generation the run stamps on CourseDetails, kept when resuming
+    generation = models.BigIntegerField()
+    # Token of the crawl lock held by the run
+    lock_token = models.CharField(max_length=32)
+    started_at = models.DateTimeField(auto_now_add=True)
+    resumed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.term} {self.generation}"
+
+    class Meta:
+        unique_together = ("term", "generation")
+
+
 def search_offerings(query):
     search_query = SearchQuery(query, search_type="websearch")
     related_offering_vector = SearchVector("related_offering", weight="A")
@@ -141,6 +262,8 @@ from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import CourseSection, Offering, CourseDetails
+from .documents import course_details_document, refresh_offerings_of
+from .meeting_slots import refresh_meeting_slots
 
 logger = logging.getLogger(__name__)
 
@@ -219,6 +342,12 @@ def update_course_section(sender, instance, created, **kwargs):
                     f"Added tutorial {instance} to CourseSection {course_section}"
                 )
 
+        CourseDetails.objects.filter(id=instance.id).update(
+            document=course_details_document(instance)
+        )
+        refresh_meeting_slots([instance])
+        refresh_offerings_of([instance])
+
 
 @receiver(post_delete, sender=CourseDetails)
 def delete_course_section(sender, instance, **kwargs):
@@ -248,3 +377,4 @@ def delete_course_section(sender, instance, **kwargs):
                 logger.debug(
                     f"Deleted CourseSection {course_section} because it has no more lectures or tutorials"
                 )
+        refresh_offerings_of([instance])
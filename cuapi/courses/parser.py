@@ -0,0 +1,195 @@
+"""
+Parsers for the pages of Carleton's public course schedule. These only deal
+with HTML, fetching is left to the callers (Celery tasks and the scrapers).
+
+Pages are parsed with lxml and, where possible, only the elements a parser
+needs are built into a tree (SoupStrainer).
+"""
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+FEATURES = "lxml"
+
+SESSION_ID_INPUT = SoupStrainer("input", attrs={"name": "session_id"})
+TERM_SELECT = SoupStrainer("select", attrs={"name": "term_code"})
+SUBJECT_SELECT = SoupStrainer("select", attrs={"name": "sel_subj"})
+CRN_CELLS = SoupStrainer("td", attrs={"style": "word-wrap: break-word"})
+TABLES = SoupStrainer("table")
+
+NOT_SUITABLE_ONLINE = "NOT SUITABLE FOR ONLINE STUDENTS"
+SUITABLE_ONLINE = "SUITABLE FOR ONLINE STUDENTS"
+
+
+def parse_session_code(html):
+    soup = BeautifulSoup(html, FEATURES, parse_only=SESSION_ID_INPUT)
+    return soup.find("input").get("value")
+
+
+def parse_terms(html):
+    soup = BeautifulSoup(html, FEATURES, parse_only=TERM_SELECT)
+    return [
+        {"term_code": option.get("value"), "term_name": option.text}
+        for option in soup.find_all("option")
+    ]
+
+
+def parse_subjects(html):
+    soup = BeautifulSoup(html, FEATURES, parse_only=SUBJECT_SELECT)
+    options = soup.find_all("option")
+    return [option.get("value") for option in options if option.get("value")]
+
+
+def parse_crns(html):
+    soup = BeautifulSoup(html, FEATURES, parse_only=CRN_CELLS)
+    crns = []
+    for a in soup.find_all("a"):
+        href = a.get("href")
+        crn = href.split("=")[-1]
+        crns.append(crn)
+    return crns
+
+
+def parse_crn_statuses(html):
+    """
+    Registration status of every CRN in a search result page, a map of CRN to
+    status. Result rows read Status, CRN, Subject, ... so the status is the
+    cell before the CRN's.
+    """
+    soup = BeautifulSoup(html, FEATURES, parse_only=TABLES)
+    statuses = {}
+    for td in soup.find_all("td", attrs={"style": "word-wrap: break-word"}):
+        a = td.find("a")
+        status = td.find_previous_sibling("td")
+        if a is not None and status is not None:
+            statuses[a.get("href").split("=")[-1]] = status.text.strip()
+    return statuses
+
+
+def is_session_rejected(html):
+    """
+    Upstream answers requests made with an expired session id by sending us
+    back to the term selection page.
+    """
+    if "term_code" not in html:
+        return False
+    soup = BeautifulSoup(html, FEATURES, parse_only=TERM_SELECT)
+    return soup.find("select") is not None
+
+
+def text_to_term_char_code(text):
+    if "Winter" in text:
+        return "W"
+    elif "Summer" in text:
+        return "S"
+    else:
+        return "F"
+
+
+def remove_section_code(text):
+    split = text.split()
+    if len(split) < 2:
+        return ""
+    return " ".join(split[:2])
+
+
+def get_section_key(text):
+    split = text.split()
+    if len(split) < 3:
+        return "$"
+    return split[2][0]
+
+
+def get_or_undefined(tds, index):
+    try:
+        return tds[index].text.strip()
+    except IndexError:
+        return ""
+
+
+def find_details_table(soup):
+    """
+    The outermost table containing the "Registration Term:" label, which is
+    the first such table in document order.
+    """
+    label = soup.find(string=lambda text: "Registration Term:" in text)
+    if label is None:
+        return None
+    tables = label.find_parents("table")
+    return tables[-1] if tables else None
+
+
+def meeting_from_cells(tds):
+    days = get_or_undefined(tds, 1)
+    return {
+        "meeting_date": get_or_undefined(tds, 0),
+        "days": days.split(" ") if days else [],
+        "time": get_or_undefined(tds, 2),
+        "schedule_type": get_or_undefined(tds, 3),
+        "instructor": get_or_undefined(tds, 4),
+    }
+
+
+def walk_details_table(table):
+    """
+    Walk every row of the details table once. Returns a map of each label cell
+    ("CRN:", ...) to the text of the cell following it, in document order, and
+    the meeting rows (those with "default" cells).
+    """
+    fields = {}
+    meeting_details = []
+    for tr in table.find_all("tr"):
+        tds = tr.find_all("td", recursive=False)
+        for i, td in enumerate(tds):
+            if "default" in td.get("class", ()):
+                meeting_details.append(meeting_from_cells(tds))
+            label = td.string
+            if label and i + 1 < len(tds) and label not in fields:
+                fields[label] = tds[i + 1].text.strip()
+    return fields, meeting_details
+
+
+def lookup(fields, search):
+    """Value of the first label containing search, like a find by text."""
+    for label, value in fields.items():
+        if search in label:
+            return value
+    return ""
+
+
+def parse_course_details(html):
+    """
+    Parse a course detail page into the fields of a CourseDetails row. Returns
+    an empty dict if the page has no details table.
+    """
+    soup = BeautifulSoup(html, FEATURES, parse_only=TABLES)
+    table = find_details_table(soup)
+    if table is None:
+        return {}
+
+    fields, meeting_details = walk_details_table(table)
+    registration_term = text_to_term_char_code(lookup(fields, "Registration Term:"))
+    crn = lookup(fields, "CRN:")
+    subject = lookup(fields, "Subject:")
+    not_suitable = any(NOT_SUITABLE_ONLINE in text for text in table.strings)
+
+    return {
+        "registration_term": registration_term,
+        "crn": crn,
+        "subject_code": subject,
+        "long_title": lookup(fields, "Long Title:"),
+        "short_title": lookup(fields, "Short Title:"),
+        "course_description": lookup(fields, "Course Description:"),
+        "course_credit_value": float(
+            lookup(fields, "Course Credit Value:").replace("\n", "0").strip()
+        ),
+        "schedule_type": lookup(fields, "Schedule Type:"),
+        "registration_status": lookup(fields, "Status:"),
+        "section_information": {
+            "section_type": lookup(fields, "Section Information:"),
+            "suitability": NOT_SUITABLE_ONLINE if not_suitable else SUITABLE_ONLINE,
+        },
+        "meeting_details": meeting_details,
+        "global_id": registration_term + crn,
+        "related_offering": remove_section_code(subject),
+        "section_key": get_section_key(subject),
+    }
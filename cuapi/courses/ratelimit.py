@@ -0,0 +1,297 @@
+"""
+Adaptive (AIMD) concurrency limits for requests to the upstream schedule.
+
+The number of requests allowed in flight grows by about one per round of
+healthy responses (additive increase) and is cut in half on a 5xx, a 429, a
+timeout or a latency spike (multiplicative decrease), so a crawl converges on
+the highest concurrency upstream sustains instead of a hand-picked constant.
+
+A latency spike is a response slower than latency_tolerance times the
+baseline, a moving average of the response times. A lasting change in
+latency (e.g. another endpoint) thus becomes the new baseline after a few
+responses instead of counting as a spike for good.
+
+    ThreadLimiter   threads of one process (CourseScraper)
+    AsyncLimiter    coroutines of one event loop (AsyncCourseScraper)
+    RedisLimiter    every Celery worker, state kept in Redis
+"""
+
+import asyncio
+import random
+import threading
+import time
+import uuid
+
+import httpx
+import redis
+from django.conf import settings
+from urllib3.util.retry import Retry
+
+from .metrics import CONCURRENCY_LIMIT
+
+LIMIT_KEY = "cuapi:scrape:limiter"
+# A lease outlives the longest request by this factor. The read timeout
+# bounds the wait for each chunk of a response, not the whole of it.
+LEASE_MARGIN = 2
+
+
+def is_overloaded(response=None, error=None):
+    """Whether a request's outcome means upstream is overloaded."""
+    if error is not None:
+        # requests' exceptions are OSErrors, httpx's are TransportErrors
+        return isinstance(error, (OSError, httpx.TransportError))
+    if response.status_code >= 500 or response.status_code == 429:
+        return True
+    # urllib3 only succeeded after retrying a failed attempt
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    return bool(retries and retries.history)
+
+
+class AIMDController:
+    def __init__(
+        self,
+        initial=4,
+        minimum=1,
+        maximum=32,
+        increase=1.0,
+        decrease=0.5,
+        latency_tolerance=2.0,
+        smoothing=0.1,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline = None
+        self.decreased_at = 0.0
+
+    def observe(self, latency, overloaded, now=None):
+        """Adjust the limit to the outcome of one request, returns the limit."""
+        now = time.monotonic() if now is None else now
+        spike = (
+            self.baseline is not None
+            and latency > self.baseline * self.latency_tolerance
+        )
+        # Failures say nothing about latency, timeouts would skew it
+        if not overloaded:
+            if self.baseline is None:
+                self.baseline = latency
+            else:
+                self.baseline += self.smoothing * (latency - self.baseline)
+        if overloaded or spike:
+            # Requests already in flight fail together, count them as one
+            # congestion event rather than halving the limit for each
+            if now - self.decreased_at >= (self.baseline or latency):
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.decreased_at = now
+        else:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+        return self.limit
+
+
+class ThreadLimiter:
+    def __init__(self, controller=None):
+        self.controller = controller or AIMDController()
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_flight < int(self.controller.limit))
+            self.in_flight += 1
+
+    def release(self, latency, overloaded):
+        with self.condition:
+            self.in_flight -= 1
+            CONCURRENCY_LIMIT.set(self.controller.observe(latency, overloaded))
+            self.condition.notify_all()
+
+    def call(self, fetch):
+        """Call fetch() once a slot is free and feed its outcome back."""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            response = fetch()
+        except Exception as e:
+            self.release(time.monotonic() - start, is_overloaded(error=e))
+            raise
+        self.release(time.monotonic() - start, is_overloaded(response))
+        return response
+
+
+class AsyncLimiter:
+    def __init__(self, controller=None):
+        self.controller = controller or AIMDController()
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def call(self, fetch):
+        """Await fetch() once a slot is free and feed its outcome back."""
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.in_flight < int(self.controller.limit)
+            )
+            self.in_flight += 1
+
+        start = time.monotonic()
+        overloaded = True
+        try:
+            response = await fetch()
+            overloaded = is_overloaded(response)
+            return response
+        except Exception as e:
+            overloaded = is_overloaded(error=e)
+            raise
+        finally:
+            async with self.condition:
+                self.in_flight -= 1
+                limit = self.controller.observe(time.monotonic() - start, overloaded)
+                CONCURRENCY_LIMIT.set(limit)
+                self.condition.notify_all()
+
+
+# Takes a lease if fewer than limit are held. Leases expire so a worker
+# killed mid-request doesn't hold its slot forever.
+ACQUIRE_SCRIPT = """
+local now, token, ttl = tonumber(ARGV[1]), ARGV[2], tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or ARGV[4])
+if redis.call('ZCARD', KEYS[2]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[2], now + ttl, token)
+    return 1
+end
+return 0
+"""
+
+# Returns the lease and applies AIMDController.observe to the shared state
+RELEASE_SCRIPT = """
+local token, latency, overloaded = ARGV[1], tonumber(ARGV[2]), ARGV[3] == '1'
+local now, initial = tonumber(ARGV[4]), tonumber(ARGV[5])
+local minimum, maximum = tonumber(ARGV[6]), tonumber(ARGV[7])
+local increase, decrease = tonumber(ARGV[8]), tonumber(ARGV[9])
+local tolerance, smoothing = tonumber(ARGV[10]), tonumber(ARGV[11])
+
+redis.call('ZREM', KEYS[2], token)
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or initial)
+local baseline = tonumber(redis.call('HGET', KEYS[1], 'baseline') or '')
+local decreased_at = tonumber(redis.call('HGET', KEYS[1], 'decreased_at') or '0')
+
+local spike = baseline and latency > baseline * tolerance
+if not overloaded then
+    if baseline then
+        baseline = baseline + smoothing * (latency - baseline)
+    else
+        baseline = latency
+    end
+    redis.call('HSET', KEYS[1], 'baseline', tostring(baseline))
+end
+
+if overloaded or spike then
+    if now - decreased_at >= (baseline or latency) then
+        limit = math.max(minimum, limit * decrease)
+        redis.call('HSET', KEYS[1], 'decreased_at', tostring(now))
+    end
+else
+    limit = math.min(maximum, limit + increase / limit)
+end
+redis.call('HSET', KEYS[1], 'limit', tostring(limit))
+return tostring(limit)
+"""
+
+
+def request_seconds():
+    """
+    The longest a request of courses/http_client.py may take: every attempt
+    timing out, plus urllib3's backoff before each retry after the first.
+    """
+    connect, read = settings.SCRAPE_HTTP_TIMEOUT
+    retries = settings.SCRAPE_HTTP_RETRIES
+    backoff = sum(
+        min(Retry.DEFAULT_BACKOFF_MAX, settings.SCRAPE_HTTP_BACKOFF * 2 ** (n - 1))
+        for n in range(2, retries + 1)
+    )
+    return (retries + 1) * (connect + read) + backoff
+
+
+class RedisLimiter:
+    """
+    AIMD limit shared by every process using the same Redis, so the Celery
+    workers together keep at most limit requests in flight.
+    """
+
+    def __init__(self, client=None, controller=None, lease_ttl=None, key=LIMIT_KEY):
+        self.redis = client or redis.Redis.from_url(settings.REDIS_URL)
+        # Only holds the parameters, the state lives in Redis
+        self.controller = controller or AIMDController()
+        # An expired lease frees its slot while the request is still running
+        self.lease_ttl = lease_ttl or LEASE_MARGIN * request_seconds()
+        self.keys = [key, f"{key}:leases"]
+        self.acquire_script = self.redis.register_script(ACQUIRE_SCRIPT)
+        self.release_script = self.redis.register_script(RELEASE_SCRIPT)
+
+    def try_acquire(self, now=None):
+        """A lease token if fewer than limit are held, else None."""
+        token = uuid.uuid4().hex
+        now = time.time() if now is None else now
+        args = [now, token, self.lease_ttl, self.controller.limit]
+        return token if self.acquire_script(self.keys, args) else None
+
+    def acquire(self):
+        while (token := self.try_acquire()) is None:
+            time.sleep(random.uniform(0.02, 0.1))
+        return token
+
+    def release(self, token, latency, overloaded, now=None):
+        c = self.controller
+        limit = self.release_script(
+            self.keys,
+            [
+                token,
+                latency,
+                int(overloaded),
+                time.time() if now is None else now,
+                c.limit,
+                c.minimum,
+                c.maximum,
+                c.increase,
+                c.decrease,
+                c.latency_tolerance,
+                c.smoothing,
+            ],
+        )
+        CONCURRENCY_LIMIT.set(float(limit))
+        return float(limit)
+
+    def call(self, fetch):
+        """Call fetch() once a slot is free and feed its outcome back."""
+        token = self.acquire()
+        start = time.monotonic()
+        try:
+            response = fetch()
+        except Exception as e:
+            self.release(token, time.monotonic() - start, is_overloaded(error=e))
+            raise
+        self.release(token, time.monotonic() - start, is_overloaded(response))
+        return response
+
+
+def controller_from_settings():
+    return AIMDController(
+        initial=settings.SCRAPE_CONCURRENCY_INITIAL,
+        minimum=settings.SCRAPE_CONCURRENCY_MIN,
+        maximum=settings.SCRAPE_CONCURRENCY_MAX,
+        latency_tolerance=settings.SCRAPE_LATENCY_TOLERANCE,
+    )
+
+
+_limiter = None
+
+
+def get_shared_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = RedisLimiter(controller=controller_from_settings())
+    return _limiter
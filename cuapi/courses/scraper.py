@@ -1,48 +1,75 @@
 import requests
-from bs4 import BeautifulSoup
+import argparse
 import json
 import os
 import threading
-from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Queue
 import time
 
-BASE_URL = "https://central.carleton.ca/prod/bwysched.p_select_term?wsea_code=EXT"
-POST_URL = "https://central.carleton.ca/prod/bwysched.p_course_search"
+from .carleton import (
+    CARLETON_BASE_URL as BASE_URL,
+    CARLETON_POST_URL as POST_URL,
+    CARLETON_SUBJECTS_URL,
+    course_url,
+    endpoint,
+    subjects_form_data,
+)
+from .metrics import PARSE_SECONDS, observe_fetch, start_metrics_server, timed
+from .parser import (
+    parse_course_details,
+    parse_crns,
+    parse_session_code,
+    parse_subjects,
+    parse_terms,
+)
+from .ratelimit import AIMDController, ThreadLimiter
 
 
 class CourseScraper:
-    def __init__(self):
+    def __init__(
+        self,
+        thread_count=16,
+        parse_processes=None,
+        batch_size=50,
+        initial_concurrency=2,
+    ):
         self.session_code = self.get_session_code()
         self.terms = self.get_terms()
-        self.thread_count = 2
+        # Fetching and parsing scale independently: threads download pages,
+        # a process pool parses them and one writer submits them in batches
+        self.thread_count = thread_count
+        # The fetch threads are only an upper bound, how many of them may
+        # request a page at once adapts to upstream's latency and errors
+        self.limiter = ThreadLimiter(
+            AIMDController(initial=initial_concurrency, maximum=thread_count)
+        )
+        self.parse_processes = parse_processes or os.cpu_count()
+        self.batch_size = batch_size
         self.queue = Queue()
+        # Bounded so fetchers wait for the parsers instead of hoarding pages
+        self.parsed = Queue(maxsize=4 * self.parse_processes)
+        # Pages that couldn't be fetched, parsed or submitted
+        self.failures = []
+
+    def fetch(self, method, url, **kwargs):
+        start = time.perf_counter()
+        response = requests.request(method, url, **kwargs)
+        observe_fetch(endpoint(url), time.perf_counter() - start)
+        return response
 
     def get_session_code(self):
-        response = requests.get(BASE_URL)
-        soup = BeautifulSoup(response.text, "html.parser")
-        session_code = soup.find("input", {"name": "session_id"}).get("value")
-        return session_code
+        response = self.fetch("GET", BASE_URL)
+        return parse_session_code(response.text)
 
     def get_terms(self):
-        response = requests.get(BASE_URL)
-        soup = BeautifulSoup(response.text, "html.parser")
-        options = soup.select("select[name='term_code'] option")
-        terms = [
-            {"term_code": option.get("value"), "term_name": option.text}
-            for option in options
-        ]
-        return terms
+        response = self.fetch("GET", BASE_URL)
+        return parse_terms(response.text)
 
     def get_subjects(self, term):
-        subjects = []
-        data = {"wsea_code": "EXT", "session_id": self.session_code, "term_code": term}
-        response = requests.post(
-            "https://central.carleton.ca/prod/bwysched.p_search_fields", data=data
-        )
-        soup = BeautifulSoup(response.text, "html.parser")
-        options = soup.select("select[name='sel_subj'] option")
-        subjects = [option.get("value") for option in options if option.get("value")]
-        return subjects
+        data = subjects_form_data(term, self.session_code)
+        response = self.fetch("POST", CARLETON_SUBJECTS_URL, data=data)
+        return parse_subjects(response.text)
 
     def setup_form_data(self, term, subject):
         data = {
@@ -101,132 +128,80 @@ class CourseScraper:
 
     def get_crns_for_subject(self, term, subject):
         data = self.setup_form_data(term, subject)
-        response = requests.post(POST_URL, data=data)
-        soup = BeautifulSoup(response.text, "html.parser")
-        crns = set()
-        for a in soup.select("td[style='word-wrap: break-word'] a"):
-            href = a.get("href")
-            crn = href.split("=")[-1]
-            crns.add(crn)
-        return list(crns)
+        response = self.fetch("POST", POST_URL, data=data)
+        return list(set(parse_crns(response.text)))
 
     def get_course_details_for_crn(self, term, crn):
-        course_url = f"https://central.carleton.ca/prod/bwysched.p_display_course?wsea_code=EXT&term_code={term}&disp={self.session_code}&crn={crn}"
-        response = requests.get(course_url)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        course_details = {}
-        tables = soup.find_all("table")
-
-        for table in tables:
-            if "Registration Term:" in table.text:
-                course_details["RegistrationTerm"] = self.find_td(
-                    table, "Registration Term:"
-                )
-                course_details["CRN"] = self.find_td(table, "CRN:")
-                course_details["SubjectCode"] = self.find_td(table, "Subject:")
-                course_details["LongTitle"] = self.find_td(table, "Long Title:")
-                course_details["ShortTitle"] = self.find_td(table, "Title:")
-                course_details["CourseDescription"] = self.find_td(
-                    table, "Course Description:"
-                )
-                course_details["CourseCreditValue"] = float(
-                    self.find_td(table, "Course Credit Value:")
-                    .replace("\n", "0")
-                    .strip()
-                )
-                course_details["ScheduleType"] = self.find_td(table, "Schedule Type:")
-                course_details["RegistrationStatus"] = self.find_td(table, "Status:")
-                suitability = (
-                    "SUITABLE FOR ONLINE STUDENTS"
-                    if "NOT SUITABLE FOR ONLINE STUDENTS" not in table.text
-                    else "NOT SUITABLE FOR ONLINE STUDENTS"
-                )
-                course_details["SectionInformation"] = {
-                    "SectionType": self.find_td(table, "Section Information:"),
-                    "Suitability": suitability,
-                }
-                course_details["MeetingDetails"] = self.get_meeting_details(table)
-                course_details["GlobalID"] = self.text_to_term_char_code(
-                    self.find_td(table, "Registration Term:")
-                ) + self.find_td(table, "CRN:")
-                course_details["RelatedOffering"] = self.remove_section_code(
-                    self.find_td(table, "Subject:")
-                )
-                course_details["SectionKey"] = self.get_section_key(
-                    self.find_td(table, "Subject:")
-                )
-
-                break
-        return course_details
-
-    def find_td(self, table, search):
-        td = table.find("td", text=lambda text: text and search in text)
-        if not td:
-            return ""
-        return td.find_next_sibling("td").text.strip()
-
-    def text_to_term_char_code(self, text):
-        if "Winter" in text:
-            return "W"
-        elif "Summer" in text:
-            return "S"
-        else:
-            return "F"
-
-    def remove_section_code(self, text):
-        split = text.split()
-        if len(split) < 2:
-            return ""
-        return " ".join(split[:2])
+        return parse_course_details(self.get_course_page(term, crn))
 
-    def get_section_key(self, text):
-        split = text.split()
-        if len(split) < 3:
-            return "$"
-        return split[2][0]
-
-    def get_meeting_details(self, table):
-        meeting_details = []
-        for td in table.select("td.default"):
-            tr = td.find_parent("tr")
-            tds = tr.find_all("td")
-            meeting_date = tds[0].text.strip()
-            days = tds[1].text.strip().split()
-            time = tds[2].text.strip()
-            schedule_type = tds[3].text.strip()
-            instructor = tds[4].text.strip()
-            meeting_details.append(
-                {
-                    "MeetingDate": meeting_date,
-                    "Days": days,
-                    "Time": time,
-                    "ScheduleType": schedule_type,
-                    "Instructor": instructor,
-                }
-            )
-        return meeting_details
+    def get_course_page(self, term, crn):
+        response = self.limiter.call(
+            lambda: self.fetch("GET", course_url(term, self.session_code, crn))
+        )
+        return response.text
 
-    def submit_course_details(self, course):
+    def submit_course_details(self, courses):
         backend_url = "http://127.0.0.1:3969/add-course-details/"
         worker_key = os.getenv("WORKER_KEY")
         request_body = {
-            "course_details": course,
+            # add_course_details expects the CRN key upper-cased
+            "course_details": [{**course, "CRN": course["crn"]} for course in courses],
             "worker_key": worker_key,
         }
         response = requests.post(backend_url, json=request_body)
         if response.status_code != 200:
             print(f"Failed to post course details: {response.status_code}")
 
-    def worker(self):
-        while not self.queue.empty():
-            term, subject, crn = self.queue.get()
+    def fetch_worker(self, executor):
+        # Fetchers only download, parsing happens in the process pool
+        while True:
+            try:
+                term, subject, crn = self.queue.get_nowait()
+            except Empty:
+                return
             print(
                 f"Getting course details for term {term}, subject {subject}, CRN {crn}"
             )
-            course_details = self.get_course_details_for_crn(term, crn)
-            self.submit_course_details(course_details)
-            self.queue.task_done()
+            try:
+                page = self.get_course_page(term, crn)
+                self.parsed.put(executor.submit(timed, parse_course_details, page))
+            except Exception as e:
+                self.fail(f"Failed to fetch CRN {crn} of term {term}: {e!r}")
+            finally:
+                # Otherwise queue.join() in run never returns
+                self.queue.task_done()
+
+    def fail(self, message):
+        print(message)
+        self.failures.append(message)
+
+    def submit_batch(self, batch):
+        try:
+            self.submit_course_details(batch)
+        except Exception as e:
+            self.fail(f"Failed to submit {len(batch)} course details: {e!r}")
+
+    def writer(self):
+        # Never stops before the end of the queue, fetchers would block forever
+        # on the bounded parsed queue
+        batch = []
+        while True:
+            future = self.parsed.get()
+            if future is None:
+                break
+            try:
+                course, seconds = future.result()
+            except Exception as e:
+                self.fail(f"Failed to parse a course page: {e!r}")
+                continue
+            PARSE_SECONDS.labels("course").observe(seconds)
+            if course:
+                batch.append(course)
+            if len(batch) >= self.batch_size:
+                self.submit_batch(batch)
+                batch = []
+        if batch:
+            self.submit_batch(batch)
 
     def run(self):
         start_time = time.time()
@@ -240,20 +215,50 @@ class CourseScraper:
                 for crn in crns:
                     self.queue.put((term["term_code"], subject, crn))
 
-        threads = []
-        for _ in range(self.thread_count):
-            thread = threading.Thread(target=self.worker)
-            thread.start()
-            threads.append(thread)
+        with ProcessPoolExecutor(max_workers=self.parse_processes) as executor:
+            writer = threading.Thread(target=self.writer)
+            writer.start()
+
+            threads = []
+            for _ in range(self.thread_count):
+                thread = threading.Thread(target=self.fetch_worker, args=(executor,))
+                thread.start()
+                threads.append(thread)
+
+            self.queue.join()
+            for thread in threads:
+                thread.join()
 
-        self.queue.join()
-        for thread in threads:
-            thread.join()
+            self.parsed.put(None)
+            writer.join()
 
         end_time = time.time()
         print(f"Time taken: {end_time - start_time}")
+        if self.failures:
+            raise RuntimeError(f"{len(self.failures)} pages failed, see above")
 
 
+# python -m courses.scraper
 if __name__ == "__main__":
-    scraper = CourseScraper()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--threads", type=int, default=16, help="Page fetchers, at most in flight"
+    )
+    parser.add_argument(
+        "--initial-concurrency",
+        type=int,
+        default=2,
+        help="Fetches in flight at first, adapts to upstream from there",
+    )
+    parser.add_argument("--parse-processes", type=int, help="Default: CPU count")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    scraper = CourseScraper(
+        args.threads, args.parse_processes, args.batch_size, args.initial_concurrency
+    )
     scraper.run()
@@ -0,0 +1,79 @@
+"""
+Upstream session id and term list, cached in Redis for all Celery workers.
+
+Every page of the course schedule needs the session id handed out by the
+landing page. Rather than downloading the landing page for every task, it is
+fetched once, cached with a TTL and only refetched when it expires or
+upstream rejects the cached id.
+"""
+
+import json
+import time
+
+import redis
+from django.conf import settings
+
+from . import archive, http_client
+from .carleton import CARLETON_BASE_URL
+from .parser import parse_session_code, parse_terms
+
+TOKEN_KEY = "cuapi:scrape:session"
+LOCK_KEY = "cuapi:scrape:session:lock"
+
+
+class SessionTokenManager:
+    def __init__(self, client=None, ttl=None):
+        self.redis = client or redis.Redis.from_url(settings.REDIS_URL)
+        self.ttl = ttl or settings.SCRAPE_SESSION_TTL
+
+    def cached(self):
+        token = self.redis.get(TOKEN_KEY)
+        return json.loads(token) if token else None
+
+    def get(self):
+        return self.cached() or self.refresh()
+
+    def refresh(self, rejected=None):
+        """
+        Fetch a new token from the landing page. With rejected, the refetch is
+        skipped if another worker already replaced that session id.
+        """
+        # Only one worker hits the landing page, the others wait for its token
+        with self.redis.lock(LOCK_KEY, timeout=60, blocking_timeout=60):
+            token = self.cached()
+            if token and token["session_code"] != rejected:
+                return token
+
+            response = http_client.get(CARLETON_BASE_URL)
+            # Each landing page gets its own small archive, pruned like the terms'
+            fetched_at = time.time_ns() // 1_000_000
+            archive.archive_page(
+                archive.LANDING, fetched_at, "landing", CARLETON_BASE_URL, response.text
+            )
+            archive.prune(archive.LANDING)
+            token = {
+                "session_code": parse_session_code(response.text),
+                "terms": [term["term_code"] for term in parse_terms(response.text)],
+            }
+            self.redis.set(TOKEN_KEY, json.dumps(token), ex=self.ttl)
+            return token
+
+    def session_code(self):
+        return self.get()["session_code"]
+
+    def terms(self):
+        return self.get()["terms"]
+
+    def replace(self, rejected_session_code):
+        """Called when upstream rejected a session id, returns a valid one."""
+        return self.refresh(rejected=rejected_session_code)["session_code"]
+
+
+_manager = None
+
+
+def get_token_manager():
+    global _manager
+    if _manager is None:
+        _manager = SessionTokenManager()
+    return _manager
@@ -0,0 +1,113 @@
+"""
+Static snapshots of a term's whole catalog, for clients that search and
+schedule locally instead of querying piecemeal.
+
+A snapshot is the term's offerings, as /query-offerings/ returns them, in one
+gzipped JSON file named after a hash of its content:
+
+    SNAPSHOT_DIR/F-3f2a9c0d1e7b4a56.json.gz
+    SNAPSHOT_DIR/F.json     the current one, see current_snapshot
+
+nginx serves the files under SNAPSHOT_URL (config/nginx.conf.template), the
+name changes with the content so they can be cached for good. A new snapshot
+is written after every crawl and status refresh that changed the term; the
+SNAPSHOT_KEEP latest are kept for clients still downloading an older one.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from .documents import join_documents
+from .models import Offering
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_content(registration_term):
+    """The uncompressed snapshot, built from the stored Offering documents."""
+    documents = (
+        Offering.objects.filter(registration_term=registration_term)
+        .order_by("related_offering")
+        .values_list("document", flat=True)
+        .iterator()
+    )
+    return (
+        f'{{"registration_term": {json.dumps(registration_term)}, '
+        f'"offerings": {join_documents(documents)}}}'
+    ).encode()
+
+
+def write_atomically(path, data):
+    # Readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def manifest_path(registration_term):
+    return os.path.join(settings.SNAPSHOT_DIR, f"{registration_term}.json")
+
+
+def current_snapshot(registration_term):
+    """The manifest of the term's current snapshot, None if there is none."""
+    try:
+        with open(manifest_path(registration_term)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_snapshot(registration_term):
+    """Write the term's snapshot if its content changed, returns its manifest."""
+    content = snapshot_content(registration_term)
+    etag = hashlib.sha256(content).hexdigest()[:16]
+    current = current_snapshot(registration_term)
+    if current is not None and current["etag"] == etag:
+        return current
+
+    os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+    name = f"{registration_term}-{etag}.json"
+    # mtime=0 so the same content always compresses to the same bytes
+    data = gzip.compress(content, mtime=0)
+    write_atomically(os.path.join(settings.SNAPSHOT_DIR, f"{name}.gz"), data)
+    manifest = {
+        "registration_term": registration_term,
+        "etag": etag,
+        "url": settings.SNAPSHOT_URL + name,
+        "size": len(content),
+        "compressed_size": len(data),
+        "generated_at": timezone.now().isoformat(),
+    }
+    write_atomically(manifest_path(registration_term), json.dumps(manifest).encode())
+    logger.info(
+        f"Wrote snapshot {name} of term {registration_term}: "
+        f"{len(content)} bytes, {len(data)} compressed"
+    )
+    prune(registration_term)
+    return manifest
+
+
+def prune(registration_term, keep=None):
+    """Delete all but the keep latest snapshots of the term."""
+    keep = settings.SNAPSHOT_KEEP if keep is None else keep
+    prefix = f"{registration_term}-"
+    snapshots = sorted(
+        (
+            entry
+            for entry in os.scandir(settings.SNAPSHOT_DIR)
+            if entry.name.startswith(prefix) and entry.name.endswith(".json.gz")
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in snapshots[keep:]:
+        os.remove(entry.path)
@@ -0,0 +1,13 @@
+"""
+Summary statistics shared by the benchmarks and the load test. Kept free of
+Django so that courses.loadtest runs without settings.
+"""
+
+
+def percentile(values, pct):
+    """The pct-th percentile of values, nearest rank, 0.0 if there are none."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
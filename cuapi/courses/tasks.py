@@ -1,317 +1,265 @@
 # tasks.py
 import json
+import logging
 from celery import shared_task, chain, group, chord
-from celery.result import allow_join_result
-import requests
-from bs4 import BeautifulSoup
 from django.conf import settings
 
-if __name__ != "__main__":
-    from .models import CourseDetails
-
-CARLETON_BASE_URL = (
-    "https://central.carleton.ca/prod/bwysched.p_select_term?wsea_code=EXT"
+from . import archive, crawl_state, http_client, snapshots
+from .changes import prune_tombstones
+from .metrics import PARSE_SECONDS, RETRIES, timed
+from .carleton import (
+    CARLETON_POST_URL,
+    CARLETON_SUBJECTS_URL,
+    COURSE_PATH,
+    SEARCH_PATH,
+    SUBJECTS_PATH,
+    canonical_url,
+    course_url,
+    setup_form_data,
+    subjects_form_data,
+)
+from .crawl_policy import (
+    cached_subjects,
+    crawl_priority,
+    due_terms,
+    mark_scraped,
+    store_subjects,
+)
+from .ingest import (
+    new_scrape_generation,
+    sweep_stale_course_details,
+    update_registration_statuses,
+    upsert_course_details,
+)
+from .parser import (
+    is_session_rejected,
+    parse_course_details,
+    parse_crn_statuses,
+    parse_crns,
+    parse_subjects,
 )
-CARLETON_POST_URL = "https://central.carleton.ca/prod/bwysched.p_course_search"
+from .session_tokens import get_token_manager
+from .terms import open_terms, registration_term
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def get_session_code():
-    response = requests.get(CARLETON_BASE_URL)
-    soup = BeautifulSoup(response.text, "html.parser")
-    session_code = soup.find("input", {"name": "session_id"}).get("value")
 
-    return session_code
+class BrokenPageError(Exception):
+    """
+    A page parsed to nothing although it should list something, likely an
+    error page. Raised to fail the term's chord, a crawl missing CRNs must
+    not sweep them.
+    """
 
 
-@shared_task
-def get_terms(session_code):
-    response = requests.get(CARLETON_BASE_URL)
-    soup = BeautifulSoup(response.text, "html.parser")
-    options = soup.select("select[name='term_code'] option")
-    terms = [
-        {"term_code": option.get("value"), "term_name": option.text}
-        for option in options
-    ]
+def fetch_with_session(session_code, fetch):
+    """
+    Call fetch(session_code) and, if upstream rejected the session id, retry
+    once with a fresh one. Returns the session id used and the response.
+    """
+    response = fetch(session_code)
+    if is_session_rejected(response.text):
+        RETRIES.labels("session").inc()
+        session_code = get_token_manager().replace(session_code)
+        response = fetch(session_code)
+    return session_code, response
 
-    terms = [term["term_code"] for term in terms]
 
-    return session_code, terms
+@shared_task(ignore_result=True)
+def get_session_code():
+    return get_token_manager().session_code()
 
 
-@shared_task
-def get_subjects(session_code_term):
-    session_code, term = session_code_term
-    data = {"wsea_code": "EXT", "session_id": session_code, "term_code": term}
-    response = requests.post(
-        "https://central.carleton.ca/prod/bwysched.p_search_fields", data=data
+@shared_task(ignore_result=True)
+def get_terms(session_code):
+    return session_code, get_token_manager().terms()
+
+
+def fetch_subjects(session_code, term, generation=None):
+    """
+    Fetch the subject list of a term and store it, see
+    crawl_policy.cached_subjects. The page is archived when crawling a
+    generation.
+    """
+    session_code, response = fetch_with_session(
+        session_code,
+        lambda session_code: http_client.post(
+            CARLETON_SUBJECTS_URL, data=subjects_form_data(term, session_code)
+        ),
     )
-    soup = BeautifulSoup(response.text, "html.parser")
-    options = soup.select("select[name='sel_subj'] option")
-    subjects = [option.get("value") for option in options if option.get("value")]
-    return session_code, term, subjects
+    if generation is not None:
+        archive.archive_page(
+            term,
+            generation,
+            "subjects",
+            canonical_url(SUBJECTS_PATH, term_code=term),
+            response.text,
+        )
+    subjects = parse_subjects(response.text)
+    # An empty list is more likely a broken page than a term without courses
+    if subjects:
+        store_subjects(term, subjects)
+    return session_code, subjects
 
 
-class FormData:
-    def __init__(self) -> None:
-        self.data = {}
-
-    def add(self, key, value):
-        # check if key exists
-        if key in self.data:
-            # if key exists, create a list of values
-            if isinstance(self.data[key], list):
-                self.data[key].append(value)
-            else:
-                self.data[key] = [self.data[key], value]
-        else:
-            self.data[key] = value
-
-    def get(self):
-        return self.data
-
-
-def setup_form_data(term, subject, session_code):
-    data = FormData()
-    data.add("wsea_code", "EXT")
-    data.add("term_code", term)
-    data.add("session_id", session_code)
-    data.add("sel_subj", subject)
-    data.add("sel_special", "N")
-    data.add("sel_begin_hh", "0")
-    data.add("sel_begin_mi", "0")
-    data.add("sel_begin_am_pm", "a")
-    data.add("sel_end_hh", "0")
-    data.add("sel_end_mi", "0")
-    data.add("sel_end_am_pm", "a")
-    days = ["m", "t", "w", "r", "f", "s", "u"]
-    for day in days:
-        data.add(f"sel_day", day)
-    dummy_fields = [
-        "sel_aud",
-        "sel_subj",
-        "sel_camp",
-        "sel_sess",
-        "sel_attr",
-        "sel_levl",
-        "sel_schd",
-        "sel_insm",
-        "sel_link",
-        "sel_wait",
-        "sel_day",
-        "sel_begin_hh",
-        "sel_begin_mi",
-        "sel_begin_am_pm",
-        "sel_end_hh",
-        "sel_end_mi",
-        "sel_end_am_pm",
-        "sel_instruct",
-        "sel_special",
-        "sel_resd",
-        "sel_breadth",
-    ]
-    for field in dummy_fields:
-        data.add(field, "dummy")
-    blank_fields = [
-        "ws_numb",
-        "sel_number",
-        "sel_crn",
-        "sel_sess",
-        "sel_schd",
-        "sel_instruct",
-        "block_button",
-        "sel_levl",
-    ]
-    for field in blank_fields:
-        data.add(field, "")
-    return data.get()
+@shared_task(ignore_result=True)
+def get_subjects(session_code_term, generation):
+    session_code, term = session_code_term
+    archive.prune(term)
+    subjects = cached_subjects(term)
+    if subjects is None:
+        session_code, subjects = fetch_subjects(session_code, term, generation)
+    return session_code, term, subjects
 
 
 @shared_task
-def get_crns_for_a_subject(session_code_term_subject):
+def get_crns_for_a_subject(session_code_term_subject, generation):
     session_code, term, subject = session_code_term_subject
-    session_code = get_session_code()
-    crns = []
-    data = setup_form_data(term, subject, session_code)
-    response = requests.post(CARLETON_POST_URL, data=data)
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    print(soup.prettify())
-
-    for a in soup.select("td[style='word-wrap: break-word'] a"):
-        href = a.get("href")
-        crn = href.split("=")[-1]
-        crns.append(crn)
-    return session_code, term, subject, crns, soup.prettify()
-
-
-@shared_task
-def create_course_details_for_crn(session_code_term_subject_crn):
-    session_code, term, subject, crn = session_code_term_subject_crn
-    course_url = f"https://central.carleton.ca/prod/bwysched.p_display_course?wsea_code=EXT&term_code={term}&disp={session_code}&crn={crn}"
-    response = requests.get(course_url)
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    details = {}
-    tables = soup.find_all("table")
-
-    def find_td(table, search):
-        td = table.find("td", text=lambda text: text and search in text)
-        if not td:
-            return ""
-        return td.find_next_sibling("td").text.strip()
-
-    def text_to_term_char_code(text):
-        if "Winter" in text:
-            return "W"
-        elif "Summer" in text:
-            return "S"
-        else:
-            return "F"
-
-    def remove_section_code(text):
-        split = text.split()
-        if len(split) < 2:
-            return ""
-        return " ".join(split[:2])
-
-    def get_section_key(text):
-        split = text.split()
-        if len(split) < 3:
-            return "$"
-        return split[2][0]
-
-    def get_or_undefined(tds, index):
-        try:
-            return tds[index].text.strip()
-        except IndexError:
-            return ""
-
-    def get_meeting_details(table):
-        meeting_details = []
-        for td in table.select("td.default"):
-            tr = td.find_parent("tr")
-            tds = tr.find_all("td")
-            meeting_date = get_or_undefined(tds, 0)
-            days = get_or_undefined(tds, 1)
-            time = get_or_undefined(tds, 2)
-            schedule_type = get_or_undefined(tds, 3)
-            instructor = get_or_undefined(tds, 4)
-
-            days_list = days.split(" ") if days else []
-
-            meeting_details.append(
-                {
-                    "meeting_date": meeting_date,
-                    "days": days_list,
-                    "time": time,
-                    "schedule_type": schedule_type,
-                    "instructor": instructor,
-                }
-            )
-        return meeting_details
-
-    for table in tables:
-        if "Registration Term:" in table.text:
-            details["registration_term"] = text_to_term_char_code(
-                find_td(table, "Registration Term:")
-            )
-            details["crn"] = find_td(table, "CRN:")
-            details["subject_code"] = find_td(table, "Subject:")
-            details["long_title"] = find_td(table, "Long Title:")
-            details["short_title"] = find_td(table, "Short Title:")
-            details["course_description"] = find_td(table, "Course Description:")
-            details["course_credit_value"] = float(
-                find_td(table, "Course Credit Value:").replace("\n", "0").strip()
-            )
-            details["schedule_type"] = find_td(table, "Schedule Type:")
-            details["registration_status"] = find_td(table, "Status:")
-            suitability = (
-                "SUITABLE FOR ONLINE STUDENTS"
-                if "NOT SUITABLE FOR ONLINE STUDENTS" not in table.text
-                else "NOT SUITABLE FOR ONLINE STUDENTS"
-            )
-            details["section_information"] = {
-                "section_type": find_td(table, "Section Information:"),
-                "suitability": suitability,
-            }
-            details["meeting_details"] = get_meeting_details(table)
-            details["global_id"] = text_to_term_char_code(
-                find_td(table, "Registration Term:")
-            ) + find_td(table, "CRN:")
-            details["related_offering"] = remove_section_code(
-                find_td(table, "Subject:")
-            )
-            details["section_key"] = get_section_key(find_td(table, "Subject:"))
-
-            break
-
-        # check if course already exists
-    if not CourseDetails.objects.filter(
-        crn=details["crn"], registration_term=details["registration_term"]
-    ).exists():
-        CourseDetails.objects.create(**details)
-    else:
-        # update the course details
-        CourseDetails.objects.filter(
-            crn=details["crn"], registration_term=details["registration_term"]
-        ).update(**details)
-
-
-def main():
-    session_code = get_session_code()
-    term = "202420"
-    subject = "STAT"
-
-    crns = get_crns_for_a_subject((session_code, term, subject))
-    print(crns)
-
-
-if __name__ == "__main__":
-    main()
+    # Searched already by the crawl this one resumes
+    crns = crawl_state.checkpointed_crns(term, generation, subject)
+    if crns is not None:
+        return session_code, term, subject, crns
+
+    session_code, response = fetch_with_session(
+        session_code,
+        lambda session_code: http_client.post(
+            CARLETON_POST_URL, data=setup_form_data(term, subject, session_code)
+        ),
+    )
+    archive.archive_page(
+        term,
+        generation,
+        "search",
+        canonical_url(SEARCH_PATH, term_code=term, sel_subj=subject),
+        response.text,
+        subject=subject,
+    )
+    crns, seconds = timed(parse_crns, response.text)
+    PARSE_SECONDS.labels("search").observe(seconds)
+    if not crns and crawl_state.has_stored_crns(term, subject):
+        raise BrokenPageError(f"Term {term}, subject {subject}: no CRNs found")
+    crawl_state.checkpoint_crns(term, generation, subject, crns)
+    # Only the CRNs go to the result backend, the page is in the archive
+    return session_code, term, subject, crns
 
 
 @shared_task
-def create_all_course_details(session_code_term_subject_crns):
-    session_code, term, subject, crns, _ = session_code_term_subject_crns
-    crn_chains = [
-        create_course_details_for_crn.s((session_code, term, subject, crn))
-        for crn in crns
+def create_course_details_for_crns(session_code_term_crns, generation):
+    """
+    Fetch a chunk of course pages over the worker's pooled session and store
+    them with one bulk upsert.
+    """
+    session_code, term, crns = session_code_term_crns
+    records = []
+    for crn in crns:
+        session_code, response = fetch_with_session(
+            session_code,
+            lambda session_code: http_client.get(course_url(term, session_code, crn)),
+        )
+        archive.archive_page(
+            term,
+            generation,
+            "course",
+            canonical_url(COURSE_PATH, term_code=term, crn=crn),
+            response.text,
+            crn=crn,
+        )
+        details, seconds = timed(parse_course_details, response.text)
+        PARSE_SECONDS.labels("course").observe(seconds)
+        if not details:
+            raise BrokenPageError(f"Term {term}, CRN {crn}: no course details")
+        records.append(details)
+
+    upsert_course_details(records, generation, term)
+    return len(records)
+
+
+@shared_task(ignore_result=True)
+def sweep_scraped_terms(stored_per_chunk, term, generation):
+    # Only runs once every CRN of the term was stored, a failed task aborts the chord
+    logger.info(f"Stored {sum(stored_per_chunk)} course details of term {term}")
+    # Scoped to the term code, other years of the season may still be crawling
+    sweep_stale_course_details(term, generation)
+    snapshots.write_snapshot(registration_term(term))
+    mark_scraped(term)
+    crawl_state.finish_crawl(term, generation)
+
+
+@shared_task(ignore_result=True)
+def create_all_course_details(session_code_term_subject_crns_list, term, generation):
+    # One task per chunk of CRNs rather than per CRN keeps broker traffic and
+    # per-task overhead proportional to the number of chunks
+    chunk_size = settings.SCRAPE_CRN_CHUNK_SIZE
+    crns = [
+        crn
+        for _, _, _, subject_crns in session_code_term_subject_crns_list
+        for crn in subject_crns
+    ]
+    if not crns:
+        # Never sweep a term on the strength of an empty (probably broken)
+        # crawl. The list is empty too if the term had no subjects.
+        crawl_state.release_lock(term, generation)
+        return
+
+    session_code = session_code_term_subject_crns_list[0][0]
+    # Stored already by the crawl this one resumes
+    stored = crawl_state.stored_crns(term, crns, generation)
+    crns = [crn for crn in crns if crn not in stored]
+    if not crns:
+        sweep_scraped_terms.delay([], term, generation)
+        return
+
+    chunk_chains = [
+        create_course_details_for_crns.s(
+            (session_code, term, crns[i : i + chunk_size]), generation
+        )
+        for i in range(0, len(crns), chunk_size)
     ]
-    group(crn_chains)()
+    chord(chunk_chains)(sweep_scraped_terms.s(term, generation))
 
 
-@shared_task
-def get_crns_for_every_subject(session_code_term_subjects):
+@shared_task(ignore_result=True)
+def get_crns_for_every_subject(session_code_term_subjects, generation):
     session_code, term, subjects = session_code_term_subjects
     crn_chains = [
-        chain(
-            get_crns_for_a_subject.s((session_code, term, subject)),
-            create_all_course_details.s(),
-        )
+        get_crns_for_a_subject.s((session_code, term, subject), generation)
         for subject in subjects
     ]
-    group(crn_chains)()
+    chord(crn_chains)(create_all_course_details.s(term, generation))
 
 
 # Create a chain for each term to get subjects, CRNs, and course details
-def create_term_chain(session_code, term):
+def create_term_chain(session_code, term, generation):
+    # Tasks started by these inherit the priority (task_inherit_parent_priority)
+    priority = crawl_priority(term)
     return chain(
-        get_subjects.s((session_code, term)),  # Get subjects for the term
-        get_crns_for_every_subject.s(),  # Get CRNs for each subject
+        # Get subjects for the term
+        get_subjects.s((session_code, term), generation).set(priority=priority),
+        # Get CRNs for each subject
+        get_crns_for_every_subject.s(generation).set(priority=priority),
     )
 
 
 # Define a callback to handle the session code and terms
-@shared_task
-def handle_session_code_and_terms(session_code_terms):
+@shared_task(ignore_result=True)
+def handle_session_code_and_terms(session_code_terms, generation, force=False):
     session_code, terms = session_code_terms
-    term_chains = [create_term_chain(session_code, term) for term in terms]
+    # Past terms are skipped unless they're due, see crawl_policy
+    term_chains = []
+    for term in due_terms(terms, force):
+        # Skips terms being crawled, may resume an unfinished crawl instead
+        term_generation = crawl_state.start_crawl(term, generation)
+        if term_generation is not None:
+            term_chains.append(create_term_chain(session_code, term, term_generation))
     group(term_chains)()
 
 
-@shared_task
-def scrape_carleton_courses():
+@shared_task(ignore_result=True)
+def scrape_carleton_courses(force=False):
+    # Every row stored by this run is stamped with its generation so rows of
+    # cancelled sections can be swept once a term completes
+    generation = new_scrape_generation()
+
     # Define the initial chain to get session code and terms
     session_code_chain = chain(
         get_session_code.s(),  # Get the session code
@@ -319,5 +267,60 @@ def scrape_carleton_courses():
     )
 
     # Chain the session code chain with the handle_session_code_and_terms task
-    full_chain = session_code_chain | handle_session_code_and_terms.s()
+    full_chain = session_code_chain | handle_session_code_and_terms.s(generation, force)
     full_chain.apply_async()
+
+
+# Seat status refresh: during registration only registration_status changes
+# often, and the search result page of a subject lists it for every CRN. So
+# instead of every course page, only one page per subject of the open terms
+# is fetched.
+
+
+@shared_task
+def refresh_subject_statuses(session_code_term_subject):
+    session_code, term, subject = session_code_term_subject
+    session_code, response = fetch_with_session(
+        session_code,
+        lambda session_code: http_client.post(
+            CARLETON_POST_URL, data=setup_form_data(term, subject, session_code)
+        ),
+    )
+    statuses = parse_crn_statuses(response.text)
+    updated = update_registration_statuses(registration_term(term), statuses)
+    if updated:
+        logger.info(f"Term {term}, subject {subject}: {updated} statuses changed")
+    return updated
+
+
+@shared_task(ignore_result=True)
+def snapshot_refreshed_term(updated_per_subject, term):
+    if any(updated_per_subject):
+        snapshots.write_snapshot(registration_term(term))
+
+
+@shared_task(ignore_result=True)
+def refresh_term_statuses(session_code_term):
+    session_code, term = session_code_term
+    subjects = cached_subjects(term)
+    if subjects is None:
+        session_code, subjects = fetch_subjects(session_code, term)
+    chord(
+        refresh_subject_statuses.s((session_code, term, subject))
+        for subject in subjects
+    )(snapshot_refreshed_term.s(term))
+
+
+@shared_task(ignore_result=True)
+def refresh_registration_status():
+    tokens = get_token_manager()
+    session_code = tokens.session_code()
+    group(
+        refresh_term_statuses.s((session_code, term))
+        for term in open_terms(tokens.terms())
+    )()
+
+
+@shared_task(ignore_result=True)
+def prune_change_feed():
+    logger.info(f"Pruned {prune_tombstones()} change feed tombstones")
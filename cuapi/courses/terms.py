@@ -0,0 +1,34 @@
+"""
+Helpers for upstream term codes, e.g. 202430: the year followed by the
+season, 10 for Winter (January-April), 20 for Summer (May-August) and 30 for
+Fall (September-December).
+"""
+
+import datetime
+
+SEASONS = {"10": "W", "20": "S", "30": "F"}
+
+
+def term_code_for(date):
+    """Code of the term running on date."""
+    if date.month <= 4:
+        season = "10"
+    elif date.month <= 8:
+        season = "20"
+    else:
+        season = "30"
+    return f"{date.year}{season}"
+
+
+def registration_term(term_code):
+    """The CourseDetails.registration_term of a term code, e.g. F for 202430."""
+    return SEASONS[term_code[-2:]]
+
+
+def open_terms(term_codes, today=None):
+    """
+    The terms still open for registration changes: the current one and those
+    after it. Earlier terms listed upstream are over.
+    """
+    current = term_code_for(today or datetime.date.today())
+    return [term_code for term_code in term_codes if term_code >= current]
@@ -1,3 +1,353 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import crawl_state
+from .async_scraper import AsyncCourseScraper
+from .catalog import generate_catalog
+from .changes import horizon, prune_tombstones
+from .fixture_server import FIXTURE_PAGES, FixtureServer
+from .ga import Schedule, ScheduleUnit
+from .ingest import sweep_stale_course_details, upsert_course_details
+from .meeting_slots import (
+    MINUTES_IN_DAY,
+    MINUTES_IN_WEEK,
+    complement,
+    excluded_ranges,
+    sections_in_window,
+)
+from .models import ChangeFeedHorizon, CourseDetails, CourseDetailsTombstone
+from .ratelimit import AIMDController, RedisLimiter, request_seconds
+from .tasks import create_all_course_details
+from .versions import VERSION_KEY, data_version
+
+
+def catalog_records(crns, crn_prefix):
+    """Records of a one subject synthetic catalog, CRNs starting with crn_prefix."""
+    records = list(generate_catalog(1, 1, crns))
+    for record in records:
+        record["crn"] = crn_prefix + record["crn"]
+        record["global_id"] = record["registration_term"] + record["crn"]
+    return records
+
+
+class SweepTests(TestCase):
+    def test_sweep_leaves_other_years_of_the_season(self):
+        fall_2024 = catalog_records(4, "24")
+        fall_2025 = catalog_records(4, "25")
+        upsert_course_details(fall_2024, 1, "202430")
+        upsert_course_details(fall_2025, 1, "202530")
+
+        # The next crawl of 202430 no longer lists the first CRN, while the
+        # one of 202530 hasn't stored anything yet
+        upsert_course_details(fall_2024[1:], 2, "202430")
+        sweep_stale_course_details("202430", 2)
+
+        self.assertEqual(
+            set(CourseDetails.objects.values_list("term_code", "crn")),
+            {("202430", record["crn"]) for record in fall_2024[1:]}
+            | {("202530", record["crn"]) for record in fall_2025},
+        )
+
+    def test_sweep_refuses_a_season_letter(self):
+        with self.assertRaises(ValueError):
+            sweep_stale_course_details("F", 2)
+
+
+@override_settings(CHANGE_FEED_TOMBSTONE_TTL=datetime.timedelta(days=30))
+class ChangeFeedTests(TestCase):
+    def test_prune_raises_the_horizon(self):
+        records = catalog_records(3, "24")
+        term = records[0]["registration_term"]
+        upsert_course_details(records, 1, "202430")
+        sweep_stale_course_details("202430", 2)
+        tombstones = list(CourseDetailsTombstone.objects.order_by("change_seq"))
+        CourseDetailsTombstone.objects.filter(
+            id__in=[tombstone.id for tombstone in tombstones[:2]]
+        ).update(deleted_at=timezone.now() - datetime.timedelta(days=31))
+
+        self.assertEqual(prune_tombstones(), 2)
+        self.assertEqual(
+            list(CourseDetailsTombstone.objects.values_list("id", flat=True)),
+            [tombstones[2].id],
+        )
+        self.assertEqual(horizon(term), tombstones[1].change_seq)
+
+    def test_cursor_below_the_horizon_is_gone(self):
+        ChangeFeedHorizon.objects.create(registration_term="F", change_seq=10)
+        for since, status in [(5, 410), (0, 200), (10, 200)]:
+            response = self.client.get("/changes/", {"term": "F", "since": since})
+            self.assertEqual(response.status_code, status, since)
+
+
+class ExcludedRangesTests(SimpleTestCase):
+    def test_complement(self):
+        self.assertEqual(complement([]), [(0, MINUTES_IN_WEEK)])
+        self.assertEqual(
+            complement([(10, 20), (15, 30), (40, MINUTES_IN_WEEK)]),
+            [(0, 10), (30, 40)],
+        )
+
+    def test_window_on_one_day(self):
+        tuesday = MINUTES_IN_DAY
+        self.assertEqual(
+            excluded_ranges(days=[1], allow=[(600, 960)]),
+            [(0, tuesday + 600), (tuesday + 960, MINUTES_IN_WEEK)],
+        )
+
+    def test_empty_window_excludes_the_week(self):
+        self.assertEqual(excluded_ranges(allow=[]), [(0, MINUTES_IN_WEEK)])
+        self.assertEqual(excluded_ranges(days=[]), [(0, MINUTES_IN_WEEK)])
+
+
+class SectionsInWindowTests(TestCase):
+    def setUp(self):
+        records = catalog_records(4, "24")
+        # The only meeting of each record, by the name the tests use for it
+        meetings = {
+            "ends_at_window_end": ("Tue", "14:35 - 16:00"),
+            "ends_after_window_end": ("Tue", "14:35 - 16:05"),
+            "starts_at_window_start": ("Thu", "10:00 - 11:25"),
+            "on_a_disallowed_day": ("Wed", "10:05 - 11:25"),
+        }
+        self.crns = {}
+        for record, (name, (day, time)) in zip(records, meetings.items()):
+            record["meeting_details"] = [
+                dict(record["meeting_details"][0], days=[day], time=time)
+            ]
+            self.crns[name] = record["crn"]
+        upsert_course_details(records, 1, "202430")
+        self.term = records[0]["registration_term"]
+
+    def crns_in_window(self, **window):
+        names = {crn: name for name, crn in self.crns.items()}
+        sections = sections_in_window(self.term, **window)
+        return {names[crn] for crn in sections.values_list("crn", flat=True)}
+
+    def test_window_bounds_are_inclusive(self):
+        self.assertEqual(
+            self.crns_in_window(days=[1, 3], allow=[(600, 960)]),
+            {"ends_at_window_end", "starts_at_window_start"},
+        )
+
+    def test_forbidden_window(self):
+        self.assertEqual(
+            self.crns_in_window(forbid=[(960, 1020)]),
+            {"ends_at_window_end", "starts_at_window_start", "on_a_disallowed_day"},
+        )
+
+    def test_empty_window_matches_nothing(self):
+        self.assertEqual(self.crns_in_window(allow=[]), set())
+        self.assertEqual(self.crns_in_window(days=[]), set())
+
+
+def course_meeting(days, time):
+    return CourseDetails(meeting_details=[{"days": days, "time": time}])
+
+
+def related(*objects):
+    return SimpleNamespace(all=lambda: list(objects))
+
+
+class ScheduleTests(SimpleTestCase):
+    def test_conflicting_minutes_count_once(self):
+        schedule = Schedule(
+            [
+                ScheduleUnit([], (None, course_meeting(["Tue"], "10:05 - 11:25"))),
+                ScheduleUnit([], (None, course_meeting(["Tue"], "10:55 - 12:25"))),
+                ScheduleUnit([], (None, course_meeting(["Wed"], "10:05 - 11:25"))),
+            ]
+        )
+        # 10:55 - 11:25 on Tuesday
+        self.assertEqual(schedule.calculate_conflicts(), 30)
+
+    def test_weekend_and_untimed_meetings(self):
+        schedule = Schedule(
+            [
+                ScheduleUnit([], (None, course_meeting(["Sat"], "09:00 - 10:00"))),
+                ScheduleUnit([], (None, course_meeting(["Sat"], "09:30 - 10:30"))),
+                ScheduleUnit([], (None, course_meeting([], ""))),
+            ]
+        )
+        self.assertEqual(schedule.calculate_conflicts(), 30)
+
+    def test_section_without_tutorials_clears_the_tutorial(self):
+        lecture = course_meeting(["Mon"], "08:35 - 09:55")
+        section = SimpleNamespace(tutorials=related(), lectures=related(lecture))
+        unit = ScheduleUnit([section], (object(), None))
+        unit.select_pair()
+        self.assertIsNone(unit.tutorial)
+        self.assertIs(unit.lecture, lecture)
+
+
+class AsyncScraperTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FixtureServer(FIXTURE_PAGES).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_crawls_the_fixture_pages(self):
+        courses = []
+
+        async def collect(course):
+            courses.append(course)
+
+        with tempfile.TemporaryDirectory() as record_dir:
+            scraper = AsyncCourseScraper(
+                base_url=self.server.base_url, sink=collect, record_dir=record_dir
+            )
+            stats = asyncio.run(scraper.run())
+            recorded = sorted(os.listdir(record_dir))
+
+        self.assertEqual(stats["errors"], 0)
+        # Every subject of both terms, a lecture and a tutorial of two courses
+        self.assertEqual(len(courses), 16)
+        self.assertEqual(
+            sorted(course["registration_term"] for course in courses),
+            ["F"] * 8 + ["W"] * 8,
+        )
+        self.assertEqual(
+            {course["related_offering"] for course in courses},
+            {"COMP 1405", "COMP 2402", "MATH 1007", "MATH 1104"},
+        )
+        # Pages are recorded under the keys they're replayed from
+        self.assertEqual(recorded, sorted(os.listdir(FIXTURE_PAGES)))
+
+    def test_posts_courses_in_batches(self):
+        batches = []
+
+        async def submit(courses):
+            batches.append(len(courses))
+
+        scraper = AsyncCourseScraper(base_url=self.server.base_url, batch_size=5)
+        scraper.submit_course_details = submit
+        asyncio.run(scraper.run())
+
+        # The last, partial batch is posted at the end of the crawl
+        self.assertEqual(batches, [5, 5, 5, 1])
+
+
+class AIMDControllerTests(SimpleTestCase):
+    def test_healthy_round_adds_about_one(self):
+        controller = AIMDController(initial=4)
+        for now in range(4):
+            controller.observe(0.1, False, now=now)
+        # 4 + 1/4 + 1/4.25 + ...
+        self.assertAlmostEqual(controller.limit, 4.92, places=2)
+
+    def test_overload_halves_once_per_baseline(self):
+        controller = AIMDController(initial=16)
+        limit = controller.observe(1.0, False, now=0)
+        controller.observe(1.0, True, now=10)
+        self.assertEqual(controller.limit, limit / 2)
+        # In flight with the first failure, the same congestion event
+        controller.observe(1.0, True, now=10.5)
+        self.assertEqual(controller.limit, limit / 2)
+        controller.observe(1.0, True, now=11)
+        self.assertEqual(controller.limit, limit / 4)
+
+    def test_latency_spike_halves(self):
+        controller = AIMDController(initial=16, latency_tolerance=2.0)
+        limit = controller.observe(1.0, False, now=0)
+        controller.observe(3.0, False, now=10)
+        self.assertEqual(controller.limit, limit / 2)
+
+    def test_limit_stays_within_bounds(self):
+        controller = AIMDController(initial=4, minimum=2, maximum=6)
+        for now in range(100):
+            controller.observe(0.1, False, now=now)
+        self.assertEqual(controller.limit, 6)
+        for now in range(100, 110):
+            controller.observe(0.1, True, now=now)
+        self.assertEqual(controller.limit, 2)
+
+
+class RedisLimiterTests(SimpleTestCase):
+    def setUp(self):
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        try:
+            client.ping()
+        except redis.ConnectionError:
+            self.skipTest("Redis isn't running")
+        key = "cuapi:test:limiter"
+        client.delete(key, f"{key}:leases")
+        self.addCleanup(client.delete, key, f"{key}:leases")
+        self.limiter = RedisLimiter(
+            client, AIMDController(initial=1), lease_ttl=60, key=key
+        )
+
+    def test_expired_lease_frees_its_slot(self):
+        self.assertIsNotNone(self.limiter.try_acquire(now=0))
+        self.assertIsNone(self.limiter.try_acquire(now=59))
+        self.assertIsNotNone(self.limiter.try_acquire(now=60))
+
+    def test_release_applies_the_controller(self):
+        controller = AIMDController(initial=1)
+        for now, latency, overloaded in [
+            (0, 1.0, False),
+            (1, 1.0, False),
+            (5, 1.0, True),
+        ]:
+            token = self.limiter.try_acquire(now=now)
+            self.assertAlmostEqual(
+                self.limiter.release(token, latency, overloaded, now=now),
+                controller.observe(latency, overloaded, now=now),
+            )
+
+
+class LeaseTTLTests(SimpleTestCase):
+    @override_settings(
+        SCRAPE_HTTP_TIMEOUT=(5, 30), SCRAPE_HTTP_RETRIES=3, SCRAPE_HTTP_BACKOFF=0.5
+    )
+    def test_request_seconds_covers_retries_and_backoff(self):
+        # Four attempts timing out, then 1s and 2s of backoff
+        self.assertEqual(request_seconds(), 4 * 35 + 1 + 2)
+
+
+class CreateAllCourseDetailsTests(SimpleTestCase):
+    def test_term_without_subjects_releases_the_lock(self):
+        with mock.patch.object(crawl_state, "release_lock") as release_lock:
+            create_all_course_details([], "202430", 3)
+        release_lock.assert_called_once_with("202430", 3)
+
+    def test_subjects_without_crns_release_the_lock(self):
+        session_code_term_subject_crns = [("session", "202430", "COMP", [])]
+        with mock.patch.object(crawl_state, "release_lock") as release_lock:
+            create_all_course_details(session_code_term_subject_crns, "202430", 3)
+        release_lock.assert_called_once_with("202430", 3)
+
+
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN="")
+    def test_disabled_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_requires_the_token(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class DataVersionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_version_of_a_term_is_stable(self):
+        self.assertEqual(data_version("F"), data_version("F"))
+
+    def test_unknown_term_has_no_version(self):
+        self.assertIsNone(data_version("202430"))
+        self.assertIsNone(cache.get(VERSION_KEY.format(term="202430")))
@@ -0,0 +1,117 @@
+"""
+Per-term data versions, for HTTP caching of the read endpoints.
+
+Each registration term has a version in the Django cache (Redis), replaced
+whenever the term's course data changes, i.e. whenever documents.py rebuilds
+Offering documents. A response is tagged with the version it was built from,
+so a conditional request is answered with 304 Not Modified after a single
+Redis lookup, before any database work:
+
+    ETag: "F-1718000000000000"     versioned(term_version)
+    Last-Modified: the time of the change
+    Cache-Control: public, max-age=API_CACHE_MAX_AGE
+
+nginx (config/nginx.conf.template) caches responses for max-age and then
+revalidates them the same way. Endpoints that aren't about one term use the
+version of all terms, replaced along with any of them.
+"""
+
+import datetime
+import functools
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from redis import RedisError
+
+from .terms import SEASONS
+
+logger = logging.getLogger(__name__)
+
+ALL_TERMS = "all"
+VERSION_KEY = "data-version:{term}"
+
+
+def new_version():
+    # Microseconds, a version lost with the cache is never handed out again
+    return time.time_ns() // 1000
+
+
+def data_version(term=ALL_TERMS):
+    """
+    The current version of term's data, None if the cache is unavailable or
+    term isn't a registration term.
+    """
+    # Versions never expire, a key per term in any URL would fill the cache
+    if term != ALL_TERMS and term not in SEASONS.values():
+        return None
+    key = VERSION_KEY.format(term=term)
+    try:
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, new_version(), timeout=None)
+            version = cache.get(key)
+    except RedisError as e:
+        logger.warning(f"Can't read the data version of term {term}: {e}")
+        return None
+    return version
+
+
+def bump(terms):
+    """Give terms, and all terms, a new data version."""
+    version = new_version()
+    keys = [VERSION_KEY.format(term=term) for term in [*terms, ALL_TERMS]]
+    try:
+        cache.set_many(dict.fromkeys(keys, version), timeout=None)
+    except RedisError as e:
+        logger.error(f"Can't update the data version of terms {terms}: {e}")
+
+
+def bump_on_commit(terms):
+    # Before the commit, a request could cache the old data as the new version
+    terms = sorted(terms)
+    transaction.on_commit(lambda: bump(terms))
+
+
+def versioned(version_func):
+    """
+    Make a GET view conditional on version_func(request, *args, **kwargs),
+    which returns (scope, version) or None for responses not to cache.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            tag = version_func(request, *args, **kwargs)
+            if tag is None or tag[1] is None:
+                return view(request, *args, **kwargs)
+
+            scope, version = tag
+            modified = datetime.datetime.fromtimestamp(
+                version / 1_000_000, datetime.timezone.utc
+            )
+            response = condition(
+                etag_func=lambda *args, **kwargs: f"{scope}-{version}",
+                last_modified_func=lambda *args, **kwargs: modified,
+            )(view)(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(
+                    response, public=True, max_age=settings.API_CACHE_MAX_AGE
+                )
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def term_version(request, term, *args, **kwargs):
+    return term, data_version(term)
+
+
+def all_terms_version(request, *args, **kwargs):
+    return ALL_TERMS, data_version()
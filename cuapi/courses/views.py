@@ -1,31 +1,23 @@
+import hmac
 import json
-from django.http import JsonResponse
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-
-from .ga import SectionScheduler
-from .models import CourseDetails, CourseSection, Offering, search_offerings
-from django.core import serializers
-from django.core.serializers.json import DjangoJSONEncoder
-from django.forms.models import model_to_dict
-
-
-class CourseSectionEncoder(DjangoJSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, CourseSection):
-            # Convert the CourseSection object to a dictionary
-            return model_to_dict(obj)
-        return super().default(obj)
-
-
-class OfferingJSONEncoder(DjangoJSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, CourseDetails):
-            return model_to_dict(obj, exclude=["id", "search_vector"])
-        elif isinstance(obj, CourseSection):
-            return model_to_dict(obj, exclude=["id", "search_vector"])
-        elif isinstance(obj, Offering):
-            return model_to_dict(obj, exclude=["id", "search_vector"])
-        return super().default(obj)
+from django.views.decorators.http import condition
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from .changes import MAX_PAGE_SIZE, PAGE_SIZE, changes_since, horizon
+from .documents import join_documents, schedules_document, with_id
+from .ga import WEEKDAYS, SchedulerProfile, SectionScheduler
+from .ingest import upsert_course_details
+from .metrics import collector_registry, observe_scheduler_profile
+from .meeting_slots import parse_time_range, sections_in_window
+from .middleware import timed_serialization
+from .models import Offering, search_offerings
+from .snapshots import current_snapshot
+from .terms import SEASONS
+from .versions import all_terms_version, data_version, term_version, versioned
 
 
 @csrf_exempt
@@ -33,35 +25,47 @@ def health_check(request):
     return JsonResponse({"message": "ok"}, status=200)
 
 
+def metrics(request):
+    # Bearer token Prometheus is configured with, see METRICS_TOKEN
+    token = settings.METRICS_TOKEN
+    if not token:
+        return JsonResponse({"message": "Metrics are disabled"}, status=404)
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization, f"Bearer {token}"):
+        return JsonResponse({"message": "Invalid metrics token"}, status=403)
+    return HttpResponse(
+        generate_latest(collector_registry()), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+def course_details_from_payload(data):
+    return {
+        "registration_term": data["registration_term"],
+        "crn": data["CRN"],
+        "subject_code": data["subject_code"],
+        "long_title": data["long_title"],
+        "short_title": data["short_title"],
+        "course_credit_value": data["course_credit_value"],
+        "schedule_type": data["schedule_type"],
+        "registration_status": data["registration_status"],
+        "global_id": data["global_id"],
+        "related_offering": data["related_offering"],
+        "section_key": data["section_key"],
+        "section_information": data["section_information"],
+        "meeting_details": data["meeting_details"],
+        "course_description": data["course_description"],
+    }
+
+
 @csrf_exempt
 def add_course_details(request):
     if request.method == "POST":
-        # Log the request body for debugging
-
         data = json.loads(request.body)
         data = data["course_details"]
-        print(json.dumps(data, indent=4))
-
-        # Create a new CourseDetails object
-        course_details = CourseDetails(
-            registration_term=data["registration_term"],
-            crn=data["CRN"],
-            subject_code=data["subject_code"],
-            long_title=data["long_title"],
-            short_title=data["short_title"],
-            course_credit_value=data["course_credit_value"],
-            schedule_type=data["schedule_type"],
-            registration_status=data["registration_status"],
-            global_id=data["global_id"],
-            related_offering=data["related_offering"],
-            section_key=data["section_key"],
-            section_information=data["section_information"],
-            meeting_details=data["meeting_details"],
-            course_description=data["course_description"],
-        )
 
-        # Save the CourseDetails object
-        course_details.save()
+        # Scrapers may submit a batch of course details at once
+        batch = data if isinstance(data, list) else [data]
+        upsert_course_details(map(course_details_from_payload, batch))
 
         return JsonResponse(
             {"message": "Course details added successfully"}, status=200
@@ -69,6 +73,7 @@ def add_course_details(request):
 
 
 @csrf_exempt
+@versioned(term_version)
 # query offerings uses a url parameter to query the database for offerings
 def query_offerings(request, term, query):
     if request.method == "GET":
@@ -77,16 +82,22 @@ def query_offerings(request, term, query):
         # Filter the offerings by term
         offerings = offerings.filter(registration_term=term)
 
-        # Serialize the offerings to JSON
-        data = json.dumps(list(map(model_to_dict, offerings)), cls=OfferingJSONEncoder)
+        with timed_serialization(request):
+            # The offerings are stored serialized, see courses/documents.py
+            data = join_documents(offerings.values_list("document", flat=True))
+
+        return HttpResponse(data, content_type="application/json")
 
-        # jsonify the data and return it as a response
-        return_data = json.loads(data)
 
-        return JsonResponse(return_data, safe=False)
+def schedule_version(request):
+    # Debug profiles are of this very run
+    if request.GET.get("debug"):
+        return None
+    return all_terms_version(request)
 
 
 @csrf_exempt
+@versioned(schedule_version)
 def schedule_offerings(request):
     param_values = request.GET.getlist("param")
     # param values is a list of Offering id strings
@@ -94,13 +105,118 @@ def schedule_offerings(request):
     ids = list(map(int, param_values))
     offerings = Offering.objects.filter(id__in=ids)
 
-    scheduler = SectionScheduler(offerings)
+    profile = SchedulerProfile()
+    scheduler = SectionScheduler(offerings, profiler=profile)
     schedules = scheduler.run()
+    # Scheduler phases in the Server-Timing header, see InstrumentationMiddleware
+    request.server_timing = dict(profile.phases)
+
+    with timed_serialization(request):
+        # Built from the stored course details documents
+        data = schedules_document(schedules)
+
+    profile.on_phase("serialize", request.serialize_seconds)
+    observe_scheduler_profile(profile)
+    # ?debug=1 adds the breakdown of the run to the response
+    if request.GET.get("debug"):
+        data = f'{{"schedules": {data}, "profile": {json.dumps(profile.as_dict())}}}'
+
+    return HttpResponse(data, content_type="application/json")
+
+
+def snapshot_manifest(term):
+    return current_snapshot(term) if term in SEASONS.values() else None
 
-    # Serialize the schedules to JSON
-    data = json.dumps(schedules, cls=CourseSectionEncoder)
 
-    # jsonify the data and return it as a response
-    return_data = json.loads(data)
+def snapshot_etag(request, term):
+    manifest = snapshot_manifest(term)
+    return manifest and manifest["etag"]
 
-    return JsonResponse(return_data, safe=False)
+
+@condition(etag_func=snapshot_etag)
+def term_snapshot(request, term):
+    # Where to download the term's catalog, see courses/snapshots.py
+    manifest = snapshot_manifest(term)
+    if manifest is None:
+        return JsonResponse({"message": "No snapshot of this term"}, status=404)
+    return JsonResponse(manifest)
+
+
+def query_term_version(request):
+    term = request.GET.get("term")
+    return (term, data_version(term)) if term in SEASONS.values() else None
+
+
+@versioned(query_term_version)
+def course_changes(request):
+    # Changes to the term's course details, see courses/changes.py
+    term = request.GET.get("term")
+    if term not in SEASONS.values():
+        return JsonResponse({"message": "Unknown term"}, status=400)
+    try:
+        since = int(request.GET.get("since", 0))
+        limit = min(int(request.GET.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"message": "since and limit must be integers"}, status=400)
+    if limit < 1:
+        return JsonResponse({"message": "limit must be positive"}, status=400)
+    if 0 < since < horizon(term):
+        # Deletions after since were pruned, the client has to start over
+        return JsonResponse(
+            {"message": "Changes since this one were pruned, sync from since=0"},
+            status=410,
+        )
+
+    changes, more = changes_since(term, since, limit)
+    with timed_serialization(request):
+        data = join_documents(
+            (
+                f'{{"seq": {seq}, "op": "upsert", "crn": {json.dumps(crn)}, '
+                f'"course_details": {with_id(course)}}}'
+                if course is not None
+                else f'{{"seq": {seq}, "op": "delete", "crn": {json.dumps(crn)}}}'
+            )
+            for seq, course, crn in changes
+        )
+        next_seq = changes[-1][0] if changes else since
+        data = (
+            f'{{"term": {json.dumps(term)}, "since": {since}, "next": {next_seq}, '
+            f'"more": {json.dumps(more)}, "changes": {data}}}'
+        )
+    return HttpResponse(data, content_type="application/json")
+
+
+@versioned(query_term_version)
+def sections_in_time_window(request):
+    # Sections meeting only in the given windows, see courses/meeting_slots.py
+    term = request.GET.get("term")
+    if term not in SEASONS.values():
+        return JsonResponse({"message": "Unknown term"}, status=400)
+    days = request.GET.get("days")
+    try:
+        if days is not None:
+            days = [WEEKDAYS.index(day) for day in days.split(",")]
+        allow = [parse_time_range(w) for w in request.GET.getlist("allow")] or None
+        forbid = [parse_time_range(w) for w in request.GET.getlist("forbid")]
+    except ValueError:
+        return JsonResponse(
+            {
+                "message": "days must be like Tue,Thu and allow and forbid like "
+                "10:00-16:00"
+            },
+            status=400,
+        )
+
+    sections = sections_in_window(term, days, allow, forbid)
+    subject = request.GET.get("subject")
+    if subject:
+        # A subject, e.g. COMP, or a course, e.g. COMP 1405
+        sections = sections.filter(
+            Q(related_offering=subject) | Q(related_offering__startswith=f"{subject} ")
+        )
+    sections = sections.order_by("related_offering", "section_key", "crn").only(
+        "id", "document"
+    )
+    with timed_serialization(request):
+        data = join_documents(with_id(course) for course in sections)
+    return HttpResponse(data, content_type="application/json")
@@ -1,5 +1,7 @@
 import os
+import shutil
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown, worker_ready
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cuapi.settings")
 app = Celery("cuapi")
@@ -11,3 +13,33 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
+
+
+# Scrape metrics, see courses/metrics.py. With PROMETHEUS_MULTIPROC_DIR set
+# every pool process writes its samples there and the main process serves
+# them merged.
+@worker_init.connect
+def clear_multiprocess_metrics(**kwargs):
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        # Samples of a previous run would be added to this one's
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+@worker_ready.connect
+def serve_metrics(**kwargs):
+    from django.conf import settings
+
+    from courses.metrics import start_metrics_server
+
+    if settings.SCRAPE_METRICS_PORT:
+        start_metrics_server(settings.SCRAPE_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
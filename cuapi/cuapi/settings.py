@@ -11,8 +11,10 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
+import datetime
 import os
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 load_dotenv()
 
@@ -66,6 +68,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so it times the whole request, see courses/middleware.py
+    "courses.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -81,16 +85,105 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 # CELERY Configuration
 CELERY_TIMEZONE = "America/Toronto"
-CELERY_TASK_TRACK_STARTED = True
+# Only chord members store results, everything else is fire-and-forget
+CELERY_TASK_TRACK_STARTED = False
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# Priorities 0 (highest) to 9 on the Redis broker, see courses/crawl_policy.py
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+CELERY_TASK_INHERIT_PARENT_PRIORITY = True
+# Synced into django_celery_beat's tables when beat starts. Seat statuses of
+# the open terms change hourly, everything else rarely.
+CELERY_BEAT_SCHEDULE = {
+    "refresh-registration-status": {
+        "task": "courses.tasks.refresh_registration_status",
+        "schedule": crontab(minute="*/15"),
+    },
+    "scrape-carleton-courses": {
+        "task": "courses.tasks.scrape_carleton_courses",
+        "schedule": crontab(minute=0, hour=3),
+    },
+    "prune-change-feed": {
+        "task": "courses.tasks.prune_change_feed",
+        "schedule": crontab(minute=30, hour=4),
+    },
+}
 
 # Redis Broker Configuration
 if DEBUG:
-    CELERY_BROKER_URL = "redis://localhost:6379/0"
-    CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
+    REDIS_URL = "redis://localhost:6379/0"
 else:
-    CELERY_BROKER_URL = "redis://redis:6379/0"
-    CELERY_RESULT_BACKEND = "redis://redis:6379/0"
+    REDIS_URL = "redis://redis:6379/0"
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+
+# Holds the per-term data versions of courses/versions.py
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "cuapi",
+    }
+}
+# Seconds browsers and nginx may reuse search and schedule responses without
+# revalidating them
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "60"))
+# How long deletions stay in the change feed, see courses/changes.py
+CHANGE_FEED_TOMBSTONE_TTL = datetime.timedelta(
+    days=int(os.getenv("CHANGE_FEED_TOMBSTONE_DAYS", "30"))
+)
+# Bearer token required to read the API's /metrics/, which are disabled
+# without one. nginx also only proxies them to private addresses.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Upstream HTTP client used by the scrape tasks, see courses/http_client.py
+SCRAPE_HTTP_POOL_SIZE = int(os.getenv("SCRAPE_HTTP_POOL_SIZE", "16"))
+SCRAPE_HTTP_RETRIES = int(os.getenv("SCRAPE_HTTP_RETRIES", "3"))
+SCRAPE_HTTP_BACKOFF = float(os.getenv("SCRAPE_HTTP_BACKOFF", "0.5"))
+# (connect, read) timeouts in seconds
+SCRAPE_HTTP_TIMEOUT = (5, 30)
+# Adaptive limit on requests in flight to upstream, shared by all workers
+# through Redis, see courses/ratelimit.py
+SCRAPE_ADAPTIVE_CONCURRENCY = os.getenv("SCRAPE_ADAPTIVE_CONCURRENCY", "True") == "True"
+SCRAPE_CONCURRENCY_INITIAL = int(os.getenv("SCRAPE_CONCURRENCY_INITIAL", "4"))
+SCRAPE_CONCURRENCY_MIN = int(os.getenv("SCRAPE_CONCURRENCY_MIN", "1"))
+SCRAPE_CONCURRENCY_MAX = int(os.getenv("SCRAPE_CONCURRENCY_MAX", "32"))
+# Responses slower than this times the usual latency count as overload
+SCRAPE_LATENCY_TOLERANCE = float(os.getenv("SCRAPE_LATENCY_TOLERANCE", "2.0"))
+# How often terms are crawled, see courses/crawl_policy.py. Past terms can't
+# change, SCRAPE_PAST_TERM_DAYS=0 never crawls them again.
+SCRAPE_OPEN_TERM_INTERVAL = datetime.timedelta(
+    hours=int(os.getenv("SCRAPE_OPEN_TERM_HOURS", "20"))
+)
+SCRAPE_PAST_TERM_INTERVAL = (
+    datetime.timedelta(days=int(os.getenv("SCRAPE_PAST_TERM_DAYS", "30"))) or None
+)
+# How long the subject lists of open terms are reused
+SCRAPE_SUBJECTS_TTL = datetime.timedelta(
+    days=int(os.getenv("SCRAPE_SUBJECTS_DAYS", "7"))
+)
+# Longest a crawl of one term may hold its lock, see courses/crawl_state.py
+SCRAPE_CRAWL_LOCK_TTL = int(os.getenv("SCRAPE_CRAWL_LOCK_TTL", str(6 * 3600)))
+# Port Celery workers serve scrape metrics on, 0 to disable. Set
+# PROMETHEUS_MULTIPROC_DIR in the worker's environment, see cuapi/celery.py.
+SCRAPE_METRICS_PORT = int(os.getenv("SCRAPE_METRICS_PORT", "9808"))
+# Number of CRNs fetched and stored by one Celery task
+SCRAPE_CRN_CHUNK_SIZE = int(os.getenv("SCRAPE_CRN_CHUNK_SIZE", "50"))
+# Per-term archives of every fetched page for offline replay, see
+# courses/archive.py. Set SCRAPE_ARCHIVE_DIR to an empty string to disable.
+SCRAPE_ARCHIVE_DIR = os.getenv("SCRAPE_ARCHIVE_DIR", str(BASE_DIR / "scrape-archive"))
+SCRAPE_ARCHIVE_KEEP = int(os.getenv("SCRAPE_ARCHIVE_KEEP", "3"))
+# Gzipped catalog snapshots of each term, see courses/snapshots.py. nginx
+# serves SNAPSHOT_DIR under SNAPSHOT_URL.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", str(BASE_DIR / "snapshots"))
+SNAPSHOT_URL = os.getenv("SNAPSHOT_URL", "/snapshots/")
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+# How long the upstream session id and term list are cached in Redis (seconds)
+SCRAPE_SESSION_TTL = int(os.getenv("SCRAPE_SESSION_TTL", "1800"))
 
 ROOT_URLCONF = "cuapi.urls"
 
@@ -19,9 +19,13 @@ from django.contrib import admin
 from django.urls import path
 from courses.views import (
     add_course_details,
+    course_changes,
     query_offerings,
     schedule_offerings,
+    sections_in_time_window,
     health_check,
+    metrics,
+    term_snapshot,
 )
 
 urlpatterns = [
@@ -33,5 +37,13 @@ urlpatterns = [
         name="query-offerings",
     ),
     path("schedule/", schedule_offerings, name="schedule-offerings"),
+    path("snapshot/<str:term>/", term_snapshot, name="term-snapshot"),
+    path("changes/", course_changes, name="course-changes"),
+    path(
+        "sections-in-window/",
+        sections_in_time_window,
+        name="sections-in-time-window",
+    ),
     path("healthz/", health_check, name="health-check"),
+    path("metrics/", metrics, name="metrics"),
 ]